@@ -2,29 +2,41 @@
 
 from flask import Flask
 from flask_cors import CORS
-from dotenv import load_dotenv
-import os
 
-# Load environment variables from .env file
-load_dotenv()
+from common import config, metrics
+from common.log import setup_logging
 
-# 景点模块（直接注册蓝图）
-from attractions.attraction import attraction_bp
 
-# 天气模块（调用 create_app() 得到 Flask 实例 + 蓝图）
-from weather.app import create_app as create_weather_app
-
-# 导入交通模块
-from transport.transport import transport_bp
+def create_combined_app():
+    # 读取 backend/.env（只读取一次，与启动目录无关）
+    config.load()
 
-# 导入高德地图API代理模块
-from transport.amap_proxy import amap_proxy_bp
+    # 结构化日志（JSON，每行一条）
+    setup_logging()
 
+    # 各模块在创建应用时才导入，导入 app.py 本身保持轻量
+    # 景点模块（直接注册蓝图）
+    from attractions.attraction import attraction_bp
+    # 天气模块（调用 create_app() 得到 Flask 实例 + 蓝图）
+    from weather.app import create_app as create_weather_app
+    # 导入交通模块
+    from transport.transport import transport_bp
+    # 导入高德地图API代理模块
+    from transport.amap_proxy import amap_proxy_bp
+    # ETag / 304、响应压缩和后台任务状态（在 config.load() 之后导入，才能读到 .env 中的配置）
+    from common import compress, jobs
 
-def create_combined_app():
     # 创建主 Flask 应用
     app = Flask(__name__)
-    CORS(app)
+    # 前端跨域调用，自定义响应头需要显式暴露给浏览器中的 JS（分页总数、各方式的路线缓存状态）
+    CORS(app, expose_headers=['X-Total-Count', 'X-Route-Cache'])
+
+    # 接口耗时统计和 /metrics
+    metrics.init_app(app)
+    # GET 响应带 ETag，较大的 JSON 响应按 Accept-Encoding 压缩
+    compress.init_app(app)
+    # 后台任务状态 /api/jobs（收藏后的预取任务）
+    jobs.init_app(app)
 
     # 注册 attractions 蓝图
     app.register_blueprint(attraction_bp)
@@ -1,40 +1,66 @@
 from flask import Blueprint, jsonify, request
-from openai import OpenAI
-import os
+import logging
 
-
-from dotenv import load_dotenv
-load_dotenv(dotenv_path='../.env')  # 确保路径正确，针对 backend 目录
+from common import config, http_client, jobs, metrics, ratelimit, store
+from common.cache import SingleFlight, TTLCache, normalize_key
+from common.db import data_path
+from common.sse import sse_event, sse_response, wants_stream
 
 attraction_bp = Blueprint('attraction', __name__)
-# 用于存储景点的内存列表
-saved_spots = []
-next_id = 1
+logger = logging.getLogger(__name__)
+
+# AI 景点推荐缓存：按归一化地点持久化缓存，并发的相同请求只调用一次大模型
+suggestion_cache = TTLCache(
+    'ai_suggestion',
+    ttl=config.get_int('AI_SUGGEST_CACHE_TTL', 7 * 24 * 3600),
+    maxsize=config.get_int('AI_SUGGEST_CACHE_SIZE', 1000),
+    db_path=data_path('cache.sqlite3')
+)
+suggestion_flight = SingleFlight()
 
 @attraction_bp.route('/api/saved_spots', methods=['GET'])
 def get_saved_spots():
-    return jsonify(saved_spots)
+    # 可选分页：?limit=&offset=，总数通过 X-Total-Count 返回
+    try:
+        limit, offset = store.parse_pagination(request.args)
+    except ValueError:
+        return jsonify({'error': '分页参数不正确'}), 400
+    spots, total = store.list_spots(limit, offset)
+    response = jsonify(spots)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 @attraction_bp.route('/api/saved_spots', methods=['POST'])
 def add_saved_spot():
-    global next_id
     data = request.get_json()
     name = data.get('name')
     if not name:
         return jsonify({'error': '景点名称不能为空'}), 400
-    # 新增：判断是否已存在同名景点
-    for spot in saved_spots:
-        if spot['name'] == name:
-            return jsonify({'error': '该景点已存在景点收藏列表中，请继续添加新景点'}), 400
-    spot = {'id': next_id, 'name': name}
-    saved_spots.append(spot)
-    next_id += 1
+    # 同名景点由数据库唯一索引判断
+    spot = store.add_spot(name)
+    if spot is None:
+        return jsonify({'error': '该景点已存在景点收藏列表中，请继续添加新景点'}), 400
+    # 后台预取景点推荐（请求中带 city 时同时预取坐标和城市天气），之后查看时直接命中缓存
+    prefetch_spot(name, data.get('city') or '')
     return jsonify({'success': True, 'spot': spot})
 
+def prefetch_spot(name, city=''):
+    """收藏景点后提交预取任务（各模块在此处才导入，避免模块之间循环导入）"""
+    from transport.transport import geocode_cache_key, prefetch_location
+    from weather.app.weather_api import normalize_location, prefetch_timeline
+
+    # 路线、矩阵等查询都按 "城市|地点" 读取地理编码缓存，不知道城市时预取的坐标用不上
+    if city:
+        jobs.submit('geocode', 'geocode|' + geocode_cache_key(city, name), prefetch_location, city, name)
+        # 天气页按城市查询，按景点名预取只会消耗配额而不会被命中
+        jobs.submit('weather', 'weather|' + normalize_location(city), prefetch_timeline, city)
+    # 与 /api/ai/suggest 使用相同的输入校验，接口会拒绝的输入不调用大模型
+    if is_valid_location(name):
+        jobs.submit('ai_suggestion', 'ai_suggestion|' + normalize_key(name), prefetch_suggestion, name)
+
 @attraction_bp.route('/api/saved_spots/<int:spot_id>', methods=['DELETE'])
 def delete_saved_spot(spot_id):
-    global saved_spots
-    saved_spots = [spot for spot in saved_spots if spot['id'] != spot_id]
+    store.delete_spot(spot_id)
     return jsonify({'success': True})
 
 @attraction_bp.route('/api/ai/suggest', methods=['POST'])
@@ -42,42 +68,122 @@ def ai_suggest():
     data = request.get_json()
     location = data.get('location')
     # 输入格式校验
-    if not location or not str(location).strip():
+    if not is_valid_location(location):
         return jsonify({'error': '输入格式错误，请重新输入'}), 400
+    if wants_stream(data):
+        return sse_response(stream_ai_suggestion(location))
+    suggestion = get_ai_suggestion(location)
+    return jsonify({'suggestion': suggestion})
+
+def is_valid_location(location):
+    """推荐景点的输入校验：拒绝空白、纯数字、过短、全英文或全符号、全特殊字符的输入"""
+    if not location or not str(location).strip():
+        return False
     location_str = str(location).strip()
     if location_str.isdigit():
-        return jsonify({'error': '输入格式错误，请重新输入'}), 400
+        return False
     if len(location_str) < 2:
-        return jsonify({'error': '输入格式错误，请重新输入'}), 400
+        return False
     if all(ord(c) < 128 and not c.isdigit() for c in location_str):  # 全英文或全符号
-        return jsonify({'error': '输入格式错误，请重新输入'}), 400
+        return False
     if all(not c.isalnum() for c in location_str):  # 全特殊字符
-        return jsonify({'error': '输入格式错误，请重新输入'}), 400
-    suggestion = get_ai_suggestion(location)
-    return jsonify({'suggestion': suggestion})
+        return False
+    return True
 
 def get_ai_suggestion(location):
+    api_key = config.get("DEEPSEEK_API_KEY")
+    if not api_key:
+        return f"{location}推荐景点：无法获取密钥，后端配置错误"
+    key = normalize_key(location)
+    suggestion = suggestion_cache.get(key)
+    if suggestion is not None:
+        return suggestion
+    try:
+        return suggestion_flight.do(key, fetch_ai_suggestion, location, api_key)
+    except Exception as e:
+        logger.exception("AI景点推荐调用失败", extra={'location': location})
+        return f"{location}推荐景点：景点A，景点B，景点C（AI调用失败：{e}）"
+
+def prefetch_suggestion(location):
+    """
+    后台任务：预取推荐景点并写入缓存
+    不经过 suggestion_flight，避免用户请求等待按后台优先级排队的调用；调用失败时抛出异常
+    """
+    api_key = config.get("DEEPSEEK_API_KEY")
+    if not api_key:
+        return "未配置密钥，跳过"
+    if suggestion_cache.get(normalize_key(location)) is not None:
+        return "已缓存"
+    fetch_ai_suggestion(location, api_key)
+    return "已生成"
+
+def build_suggestion_messages(location):
     prompt = (
         f"请只返回{location}最值得推荐的3个著名旅游景点的名称，"
         f"不要用markdown语法，用中文逗号分隔，每个景点加编号和一句简短的介绍（例如：1. 外滩，上海的地标性景点，欣赏黄浦江两岸的壮丽景色。2. 豫园，江南古典园林的代表，体验传统建筑和园林艺术。3. 东方明珠塔，上海的象征之一，俯瞰城市全景的绝佳地点。）每个景点之间有回车换行隔开。"
     )
-    api_key = os.getenv("DEEPSEEK_API_KEY")
+    return [
+        {"role": "system", "content": "你是一个旅游助手，只返回景点名称。"},
+        {"role": "user", "content": prompt},
+    ]
+
+def format_suggestion(result):
+    spots = [name.strip() for name in result.strip().split('，') if name.strip()]
+    return '，'.join(spots)
+
+def fetch_ai_suggestion(location, api_key):
+    """调用 DeepSeek 获取推荐景点，成功的结果写入缓存（失败时抛出异常，不缓存）"""
+    client = http_client.get_openai_client('deepseek', api_key)
+    with http_client.get_breaker('deepseek').guard():
+        ratelimit.acquire('deepseek')
+        with metrics.observe_upstream('deepseek'):
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=build_suggestion_messages(location),
+                stream=False
+            )
+    suggestion = format_suggestion(response.choices[0].message.content)
+    suggestion_cache.set(normalize_key(location), suggestion)
+    return suggestion
+
+def stream_ai_suggestion(location):
+    """
+    以 SSE 逐段返回推荐景点：生成过程中发送 {"delta": ...}，
+    结束时发送 done 事件 {"suggestion": 完整结果}；缓存命中或出错时直接发送 done 事件
+    """
+    api_key = config.get("DEEPSEEK_API_KEY")
     if not api_key:
-        return f"{location}推荐景点：无法获取密钥，后端配置错误"
+        yield sse_event({'suggestion': f"{location}推荐景点：无法获取密钥，后端配置错误"}, event='done')
+        return
+    suggestion = suggestion_cache.get(normalize_key(location))
+    if suggestion is not None:
+        yield sse_event({'suggestion': suggestion}, event='done')
+        return
+
+    stream = None
     try:
-        client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "你是一个旅游助手，只返回景点名称。"},
-                {"role": "user", "content": prompt},
-            ],
-            stream=False
-        )
-        result = response.choices[0].message.content.strip()
-        spots = [name.strip() for name in result.split('，') if name.strip()]
-        return '，'.join(spots)
+        client = http_client.get_openai_client('deepseek', api_key)
+        with http_client.get_breaker('deepseek').guard():
+            ratelimit.acquire('deepseek')
+            with metrics.observe_upstream('deepseek'):
+                stream = client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=build_suggestion_messages(location),
+                    stream=True
+                )
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield sse_event({'delta': delta})
+        suggestion = format_suggestion(''.join(parts))
+        suggestion_cache.set(normalize_key(location), suggestion)
+        yield sse_event({'suggestion': suggestion}, event='done')
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
-        return f"{location}推荐景点：景点A，景点B，景点C（AI调用失败：{e}）" 
+        logger.exception("AI景点推荐流式调用失败", extra={'location': location})
+        yield sse_event({'suggestion': f"{location}推荐景点：景点A，景点B，景点C（AI调用失败：{e}）"}, event='done')
+    finally:
+        # 客户端断开时生成器被关闭，同时关闭上游连接
+        if stream is not None:
+            stream.close()
@@ -0,0 +1,38 @@
+# bench/app_server.py
+# 压测时在独立进程中启动后端（上游地址通过环境变量指向模拟服务）
+#
+#   python -m bench.app_server --port 15000 --mode gevent
+
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动用于压测的后端服务')
+    parser.add_argument('--port', type=int, default=15000)
+    parser.add_argument('--mode', choices=('threaded', 'gevent'), default='threaded')
+    args = parser.parse_args()
+
+    if args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+        os.environ.setdefault('ROUTE_WORKERS', '256')
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_combined_app
+    app = create_combined_app()
+
+    if args.mode == 'gevent':
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(('127.0.0.1', args.port), app, spawn=Pool(1000), log=None).serve_forever()
+    else:
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server('127.0.0.1', args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+# bench/fake_upstreams.py
+# 本地模拟的上游服务，用于离线压测：
+#   高德（地理编码、驾车、步行、公交）、tomorrow.io 天气预报、OpenAI 兼容的 DeepSeek / Moonshot 接口
+# 每类上游的延迟、错误率和返回数据量都可配置。
+#
+#   python -m bench.fake_upstreams --port 18080 --amap-latency 80 --error-rate 0.01
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+DEFAULT_CONFIG = {
+    'amap_latency_ms': 80,       # 高德接口平均延迟
+    'weather_latency_ms': 150,   # tomorrow.io 平均延迟
+    'llm_latency_ms': 1500,      # 大模型完整生成耗时
+    'jitter': 0.3,               # 延迟随机波动比例
+    'error_rate': 0.0,           # 返回 500 的概率
+    'route_points': 200,         # 每条路线 polyline 的坐标点数
+    'route_steps': 10,           # 每条路线的分段数
+    'forecast_hours': 120,       # 天气预报小时数
+    'llm_tokens': 60,            # 大模型回答的分段数（流式时逐段返回）
+}
+
+
+def upstream_env(base_url):
+    """把后端的上游地址指向本地模拟服务所需的环境变量"""
+    return {
+        'AMAP_BASE_URL': base_url,
+        'TOMORROW_BASE_URL': base_url,
+        'DEEPSEEK_BASE_URL': base_url,
+        'MOONSHOT_BASE_URL': base_url,
+        'AMAP_BACKEND_KEY': 'bench',
+        'TOMORROW_API_KEY': 'bench',
+        'DEEPSEEK_API_KEY': 'bench',
+        'MOONSHOT_API_KEY': 'bench',
+        # 压测的是后端本身，不受真实上游的限流配额约束
+        'RATE_LIMIT_ENABLED': '0',
+    }
+
+
+def polyline(rng, start, points):
+    lng, lat = start
+    coords = []
+    for _ in range(points):
+        lng += rng.uniform(-0.0005, 0.001)
+        lat += rng.uniform(-0.0005, 0.001)
+        coords.append(f"{lng:.6f},{lat:.6f}")
+    return ';'.join(coords)
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = DEFAULT_CONFIG
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------- 请求分发 ----------
+
+    def do_GET(self):
+        self.dispatch(None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.dispatch(json.loads(body or b'{}'))
+
+    def dispatch(self, body):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        routes = {
+            '/v3/geocode/geo': ('amap', self.geocode),
+            '/v3/direction/driving': ('amap', self.path_route),
+            '/v3/direction/walking': ('amap', self.path_route),
+            '/v3/direction/transit/integrated': ('amap', self.transit_route),
+            '/v4/weather/forecast': ('weather', self.forecast),
+            '/chat/completions': ('llm', self.chat),
+            '/v1/chat/completions': ('llm', self.chat),
+        }
+        if url.path not in routes:
+            return self.send_json(404, {'error': 'not found'})
+        kind, handler = routes[url.path]
+        if random.random() < self.config['error_rate']:
+            self.sleep(kind, 0.2)
+            return self.send_json(500, {'error': 'injected failure'})
+        if kind == 'llm' and body and body.get('stream'):
+            return self.chat_stream(body)
+        self.sleep(kind)
+        handler(query, body)
+
+    def sleep(self, kind, factor=1.0):
+        latency = self.config[f'{kind}_latency_ms'] / 1000.0 * factor
+        jitter = self.config['jitter']
+        time.sleep(max(0.0, latency * random.uniform(1 - jitter, 1 + jitter)))
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # ---------- 高德 ----------
+
+    def geocode(self, query, body):
+        rng = random.Random(f"{query.get('city')}|{query.get('address')}")
+        location = f"{rng.uniform(113.2, 113.4):.6f},{rng.uniform(23.0, 23.2):.6f}"
+        self.send_json(200, {'status': '1', 'count': '1', 'geocodes': [{'location': location}]})
+
+    def steps(self, rng, query):
+        lng, lat = (float(v) for v in query.get('origin', '113.3,23.1').split(','))
+        per_step = max(2, self.config['route_points'] // self.config['route_steps'])
+        return [{
+            'instruction': f'沿<b>道路{i}</b>行驶',
+            'polyline': polyline(rng, (lng + i * 0.01, lat + i * 0.01), per_step)
+        } for i in range(self.config['route_steps'])]
+
+    def path_route(self, query, body):
+        rng = random.Random(self.path)
+        self.send_json(200, {'status': '1', 'count': '1', 'route': {'paths': [{
+            'duration': str(rng.randint(600, 3600)),
+            'distance': str(rng.randint(1000, 30000)),
+            'steps': self.steps(rng, query)
+        }]}})
+
+    def transit_route(self, query, body):
+        rng = random.Random(self.path)
+        transits = []
+        for name in ('公交12路', '地铁2号线(广州南站--嘉禾望岗)'):
+            transits.append({
+                'duration': str(rng.randint(900, 4000)),
+                'distance': str(rng.randint(2000, 30000)),
+                'segments': [{
+                    'walking': {'distance': '300', 'steps': self.steps(rng, query)[:2]},
+                    'bus': {'buslines': [{
+                        'name': name,
+                        'polyline': polyline(rng, (113.3, 23.1), self.config['route_points']),
+                        'departure_stop': {'name': '起点站'},
+                        'arrival_stop': {'name': '终点站'}
+                    }]}
+                }]
+            })
+        self.send_json(200, {'status': '1', 'count': str(len(transits)), 'route': {'transits': transits}})
+
+    # ---------- tomorrow.io ----------
+
+    def forecast(self, query, body):
+        rng = random.Random(query.get('location'))
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hourly = [{
+            'time': (start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'values': {
+                'temperature': round(rng.uniform(10, 32), 1),
+                'humidity': rng.randint(30, 95),
+                'precipitationProbability': rng.choice([0, 0, 5, 20, 40, 80]),
+                'weatherCode': rng.choice([1000, 1100, 1101, 4000, 4001])
+            }
+        } for i in range(self.config['forecast_hours'])]
+        self.send_json(200, {'timelines': {'hourly': hourly}})
+
+    # ---------- OpenAI 兼容接口 ----------
+
+    def answer_parts(self):
+        return [f"{i // 20 + 1}. 景点{i}，" if i % 20 == 0 else '介绍文字' for i in range(self.config['llm_tokens'])]
+
+    def chat(self, query, body):
+        self.send_json(200, {
+            'id': 'bench', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': (body or {}).get('model', 'bench'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': ''.join(self.answer_parts())}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 10, 'total_tokens': 20}
+        })
+
+    def chat_stream(self, body):
+        parts = self.answer_parts()
+        delay = self.config['llm_latency_ms'] / 1000.0 / max(1, len(parts))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for part in parts:
+                time.sleep(delay)
+                chunk = {'id': 'bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                         'model': body.get('model', 'bench'),
+                         'choices': [{'index': 0, 'delta': {'content': part}, 'finish_reason': None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+def start_fake_upstreams(port=0, **overrides):
+    """在后台线程启动模拟服务，返回 (server, base_url)"""
+    config = dict(DEFAULT_CONFIG, **overrides)
+    handler = type('ConfiguredHandler', (FakeUpstreamHandler,), {'config': config})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def add_config_arguments(parser):
+    parser.add_argument('--amap-latency', type=float, default=DEFAULT_CONFIG['amap_latency_ms'], help='高德接口延迟（毫秒）')
+    parser.add_argument('--weather-latency', type=float, default=DEFAULT_CONFIG['weather_latency_ms'], help='天气接口延迟（毫秒）')
+    parser.add_argument('--llm-latency', type=float, default=DEFAULT_CONFIG['llm_latency_ms'], help='大模型生成耗时（毫秒）')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_CONFIG['jitter'], help='延迟波动比例')
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_CONFIG['error_rate'], help='上游返回 500 的概率')
+    parser.add_argument('--route-points', type=int, default=DEFAULT_CONFIG['route_points'], help='每条路线的坐标点数')
+    parser.add_argument('--forecast-hours', type=int, default=DEFAULT_CONFIG['forecast_hours'], help='天气预报小时数')
+
+
+def config_from_args(args):
+    return {
+        'amap_latency_ms': args.amap_latency,
+        'weather_latency_ms': args.weather_latency,
+        'llm_latency_ms': args.llm_latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'route_points': args.route_points,
+        'forecast_hours': args.forecast_hours,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动本地模拟上游服务')
+    parser.add_argument('--port', type=int, default=18080)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server, base_url = start_fake_upstreams(args.port, **config_from_args(args))
+    print(f"模拟上游服务已启动: {base_url}")
+    for key, value in upstream_env(base_url).items():
+        print(f"  {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+# bench/loadgen.py
+# 离线压测：启动模拟上游和后端进程，逐个接口施压，统计 p50/p95/p99 延迟和每秒请求数，
+# 结果保存为 JSON，可与基线对比以发现性能回退。
+#
+#   cd backend
+#   python -m bench.loadgen --duration 20 --concurrency 32
+#   python -m bench.loadgen --compare bench/results/baseline.json
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+from .fake_upstreams import add_config_arguments, config_from_args, start_fake_upstreams, upstream_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'bench', 'results')
+
+CITIES = ['广州', '上海', '北京', '深圳', '杭州', '成都']
+PLACES = ['火车站', '南站', '东站', '机场', '市政府', '人民公园', '博物馆', '体育中心',
+          '大学城', '科技园', '会展中心', '步行街', '动物园', '植物园', '图书馆', '大剧院']
+
+
+# ---------- 各接口的请求构造 ----------
+
+def pick_place(rng, unique_ratio):
+    """按 unique_ratio 的概率生成不重复的地点（缓存未命中），否则从热门地点中选"""
+    if rng.random() < unique_ratio:
+        return f"{rng.choice(PLACES)}{rng.randint(1, 10 ** 6)}号"
+    return rng.choice(PLACES)
+
+
+def transport_request(rng, unique_ratio):
+    city = rng.choice(CITIES)
+    origin, destination = pick_place(rng, unique_ratio), pick_place(rng, unique_ratio)
+    return 'POST', '/api/transport/search', {'city': city, 'origin': origin, 'destination': destination}
+
+
+def weather_request(rng, unique_ratio):
+    start = date.today() + timedelta(days=rng.randint(0, 2))
+    location = rng.choice(CITIES) if rng.random() >= unique_ratio else f"{rng.choice(CITIES)}{rng.randint(1, 10 ** 6)}"
+    return 'POST', '/api/weather', {
+        'location': location,
+        'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=1)).isoformat()
+    }
+
+
+def weather_batch_request(rng, unique_ratio):
+    # 一次行程的多个城市、多个日期，城市可能重复
+    entries = [weather_request(rng, unique_ratio)[2] for _ in range(rng.randint(2, 6))]
+    return 'POST', '/api/weather/batch', {'entries': entries}
+
+
+def suggest_request(rng, unique_ratio):
+    location = rng.choice(CITIES) if rng.random() >= unique_ratio else f"{rng.choice(CITIES)}{rng.randint(1, 10 ** 6)}区"
+    return 'POST', '/api/ai/suggest', {'location': location}
+
+
+def advice_request(rng, unique_ratio):
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    weather = [{
+        'time': (start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'temperature': round(rng.uniform(5, 35), 1),
+        'precipitationProbability': rng.choice([0, 10, 30, 60, 90])
+    } for i in range(6)]
+    return 'POST', '/api/advice', {'weather': weather}
+
+
+def saved_spots_request(rng, unique_ratio):
+    return 'GET', '/api/saved_spots', None
+
+
+ENDPOINTS = {
+    'transport_search': transport_request,
+    'weather': weather_request,
+    'weather_batch': weather_batch_request,
+    'ai_suggest': suggest_request,
+    'advice': advice_request,
+    'saved_spots': saved_spots_request,
+}
+
+
+# ---------- 施压与统计 ----------
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(base_url, make_request, duration, concurrency, unique_ratio, seed):
+    """在 duration 秒内以 concurrency 个并发持续请求同一接口"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        local_latencies, local_errors = [], []
+        while time.perf_counter() < deadline:
+            method, path, body = make_request(rng, unique_ratio)
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=60)
+                response.content
+                ok = response.status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            local_latencies.append(elapsed)
+            if not ok:
+                local_errors.append(elapsed)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.extend(local_errors)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def start_backend(upstream_url, port, mode, data_dir):
+    env = dict(os.environ, **upstream_env(upstream_url), DATA_DIR=data_dir)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'bench.app_server', '--port', str(port), '--mode', mode],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('后端进程启动失败')
+        try:
+            requests.get(base_url + '/api/saved_spots', timeout=1)
+            return process, base_url
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('等待后端启动超时')
+
+
+def compare(results, baseline, threshold):
+    """与基线对比：p95 变慢或吞吐下降超过 threshold 视为回退，返回回退的接口列表"""
+    regressions = []
+    print(f"\n与基线对比（阈值 {threshold:.0%}）:")
+    for name, current in results['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(name)
+        if not base:
+            continue
+        p95_change = (current['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        rps_change = (current['rps'] - base['rps']) / base['rps'] if base['rps'] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<18} p95 {p95_change:+.1%}  rps {rps_change:+.1%}{'  <-- 回退' if regressed else ''}")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'接口':<18}{'请求数':>8}{'错误':>6}{'rps':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, r in results['endpoints'].items():
+        print(f"{name:<18}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端离线压测')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='逗号分隔的接口名')
+    parser.add_argument('--duration', type=float, default=15, help='每个接口的压测时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发数')
+    parser.add_argument('--unique-ratio', type=float, default=0.3, help='不重复请求（缓存未命中）的比例')
+    parser.add_argument('--mode', choices=('threaded', 'gevent'), default='threaded', help='后端运行模式')
+    parser.add_argument('--port', type=int, default=15000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='结果文件路径，默认保存到 bench/results/<时间>.json')
+    parser.add_argument('--compare', help='基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.1, help='判定回退的变化比例')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"未知接口: {', '.join(unknown)}")
+
+    upstream_config = config_from_args(args)
+    fake_server, upstream_url = start_fake_upstreams(**upstream_config)
+    with tempfile.TemporaryDirectory() as data_dir:
+        process, base_url = start_backend(upstream_url, args.port, args.mode, data_dir)
+        try:
+            endpoints = {}
+            for name in names:
+                print(f"压测 {name} ...")
+                endpoints[name] = run_endpoint(base_url, ENDPOINTS[name], args.duration,
+                                               args.concurrency, args.unique_ratio, args.seed)
+        finally:
+            process.terminate()
+            process.wait()
+            fake_server.shutdown()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'mode': args.mode,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'unique_ratio': args.unique_ratio,
+            'upstream': upstream_config,
+        },
+        'endpoints': endpoints,
+    }
+    print_table(results)
+
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
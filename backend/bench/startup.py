@@ -0,0 +1,91 @@
+# bench/startup.py
+# 冷启动耗时：在全新的 Python 进程中分别统计导入 app.py、创建应用和处理第一个请求的耗时，
+# 多次运行取中位数；--importtime 列出导入最慢的模块。
+#
+#   cd backend
+#   python -m bench.startup --runs 10
+#   python -m bench.startup --importtime
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行，输出各阶段耗时（秒）
+CHILD_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_combined_app()
+created = time.perf_counter()
+application.test_client().get('/api/saved_spots')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create': created - imported, 'first_request': served - created}))
+'''
+
+STAGES = ('import', 'create', 'first_request', 'total')
+
+
+def run_once(env):
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', CHILD_SCRIPT], cwd=BACKEND_DIR, env=env, text=True)
+    timings = json.loads(output.strip().splitlines()[-1])
+    # total 包含解释器自身的启动时间
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+
+def import_times(env, top):
+    """用 -X importtime 统计各模块的累计导入耗时（微秒），返回最慢的 top 个"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app; app.create_combined_app()'],
+                            cwd=BACKEND_DIR, env=env, text=True, capture_output=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 模块名前的缩进表示嵌套层级，只统计顶层模块，避免子模块重复计入
+        if not name[1:].startswith(' '):
+            modules[name.strip()] = int(cumulative)
+    return sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端冷启动耗时')
+    parser.add_argument('--runs', type=int, default=5, help='运行次数')
+    parser.add_argument('--importtime', action='store_true', help='列出导入最慢的模块')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--out', help='把结果保存为 JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, DATA_DIR=data_dir, LOG_LEVEL='WARNING')
+        runs = [run_once(env) for _ in range(args.runs)]
+
+        print(f"{'阶段':<16}{'中位数(ms)':>12}{'最小(ms)':>12}{'最大(ms)':>12}")
+        summary = {}
+        for stage in STAGES:
+            values = [run[stage] * 1000 for run in runs]
+            summary[stage] = {'median_ms': round(statistics.median(values), 1),
+                              'min_ms': round(min(values), 1), 'max_ms': round(max(values), 1)}
+            print(f"{stage:<16}{summary[stage]['median_ms']:>12}{summary[stage]['min_ms']:>12}{summary[stage]['max_ms']:>12}")
+
+        if args.importtime:
+            print("\n导入最慢的模块（累计，ms）:")
+            for name, micros in import_times(env, args.top):
+                print(f"  {name:<40}{micros / 1000:>10.1f}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'runs': args.runs, 'stages': summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
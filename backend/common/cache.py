@@ -0,0 +1,226 @@
+# common/cache.py
+# 带过期时间（TTL）和 LRU 淘汰的缓存，可选持久化到 SQLite，重启后仍然有效
+
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# 所有缓存实例（用于 /metrics 输出命中率），元素需提供 stats() 方法
+_caches = []
+
+
+def register_cache(cache):
+    _caches.append(cache)
+    return cache
+
+
+def all_caches():
+    return list(_caches)
+
+
+def normalize_key(text):
+    """归一化缓存键中的文本：全角转半角、去除多余空白、统一小写"""
+    text = unicodedata.normalize('NFKC', str(text or ''))
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class SingleFlight:
+    """同一个键的并发调用只执行一次，其余调用等待并共享结果（或异常）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class TTLCache:
+    """
+    线程安全的 TTL + LRU 缓存
+
+    - 内存中按最近使用顺序保存最多 maxsize 条
+    - 指定 db_path 时写入 SQLite，内存未命中时从磁盘加载（值需可 JSON 序列化）
+    - stale_ttl > 0 时，过期后的 stale_ttl 秒内仍保留条目，lookup() 可返回过期值供后台刷新期间使用
+    - stats() 返回命中/未命中计数
+    """
+
+    def __init__(self, name, ttl, maxsize=1024, db_path=None, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._writes = 0
+        if db_path:
+            self._init_db()
+        register_cache(self)
+
+    # ---------- 对外接口 ----------
+
+    def get(self, key, default=None):
+        """读取未过期的缓存值，未命中返回 default"""
+        value, state = self.lookup(key, allow_stale=False)
+        return default if state == 'miss' else value
+
+    def lookup(self, key, allow_stale=True):
+        """读取缓存，返回 (value, state)，state 为 'hit'、'stale' 或 'miss'"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] + self.stale_ttl <= now:
+                del self._entries[key]
+                entry = None
+        if entry is None and self.db_path:
+            entry = self._db_get(key, now)
+
+        with self._lock:
+            if entry is not None:
+                self._remember(key, entry)
+                if entry[1] > now:
+                    self._hits += 1
+                    return entry[0], 'hit'
+                if allow_stale:
+                    self._stale += 1
+                    return entry[0], 'stale'
+            self._misses += 1
+            return None, 'miss'
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，ttl 为空时使用默认过期时间"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        entry = (value, expires_at)
+        with self._lock:
+            self._remember(key, entry)
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if self.db_path:
+            self._db_set(key, entry, prune)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.db_path:
+            self._db().execute('DELETE FROM cache_entries WHERE cache = ? AND key = ?', (self.name, key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            self._db().execute('DELETE FROM cache_entries WHERE cache = ?', (self.name,))
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale': self._stale,
+                'hit_ratio': round(self._hits / total, 4) if total else 0.0
+            }
+
+    # ---------- 内部实现 ----------
+
+    def _remember(self, key, entry):
+        # 调用方需持有 self._lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _db(self):
+        return get_connection(self.db_path)
+
+    def _init_db(self):
+        conn = self._db()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            ' cache TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL,'
+            ' PRIMARY KEY (cache, key))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (cache, accessed_at)')
+
+    def _db_get(self, key, now):
+        try:
+            conn = self._db()
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?',
+                (self.name, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.stale_ttl <= now:
+                conn.execute('DELETE FROM cache_entries WHERE cache = ? AND key = ?', (self.name, key))
+                return None
+            # 只在从磁盘加载到内存时更新访问时间，热点数据由内存层承担
+            conn.execute(
+                'UPDATE cache_entries SET accessed_at = ? WHERE cache = ? AND key = ?',
+                (now, self.name, key)
+            )
+            return json.loads(row[0]), row[1]
+        except Exception as e:
+            logger.warning("缓存读取错误", extra={'cache': self.name, 'error': str(e)})
+            return None
+
+    def _db_set(self, key, entry, prune=False):
+        try:
+            conn = self._db()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.name, key, json.dumps(entry[0], ensure_ascii=False), entry[1], time.time())
+            )
+            if prune:
+                self._db_prune(conn)
+        except Exception as e:
+            logger.warning("缓存写入错误", extra={'cache': self.name, 'error': str(e)})
+
+    def _db_prune(self, conn):
+        """清理过期条目，并按最近访问时间淘汰超出容量的条目"""
+        conn.execute(
+            'DELETE FROM cache_entries WHERE cache = ? AND expires_at <= ?',
+            (self.name, time.time() - self.stale_ttl)
+        )
+        conn.execute(
+            'DELETE FROM cache_entries WHERE cache = ? AND key IN ('
+            ' SELECT key FROM cache_entries WHERE cache = ?'
+            ' ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.name, self.name, self.maxsize)
+        )
@@ -0,0 +1,128 @@
+# common/circuit.py
+# 上游熔断：连续失败达到阈值后在一段时间内直接拒绝调用（不再占用工作线程等待超时），
+# 到期后放行一个探测请求，成功则恢复，失败则继续熔断
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from . import metrics, ratelimit
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_rejected = metrics.Counter(
+    'circuit_rejected_total', '熔断期间被直接拒绝的上游调用', ('upstream',))
+circuit_opened = metrics.Counter(
+    'circuit_opened_total', '熔断次数', ('upstream',))
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """熔断拒绝；继承 RequestException，调用方按上游请求失败处理"""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """调用前检查：熔断中抛出 CircuitOpen；半开状态同时只放行一个探测请求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._reject()
+                self.state, self._probing = HALF_OPEN, False
+            if self._probing:
+                self._reject()
+            self._probing = True
+
+    def _reject(self):
+        circuit_rejected.inc(self.name)
+        raise CircuitOpen(f"{self.name}: 上游暂时不可用（熔断中）")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("上游已恢复，结束熔断", extra={'upstream': self.name})
+            self.state, self._failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                logger.warning("上游连续失败，开始熔断",
+                               extra={'upstream': self.name, 'failures': self._failures,
+                                      'reset_timeout': self.reset_timeout})
+                circuit_opened.inc(self.name)
+                self.state, self._opened_at, self._probing = OPEN, time.monotonic(), False
+
+    def release(self):
+        """调用没有真正发出（如被限流拒绝）时归还探测名额"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    @contextmanager
+    def guard(self):
+        """包装不经过 http_client 的调用（如 OpenAI SDK）；4xx 等客户端错误不计为失败"""
+        self.allow()
+        try:
+            yield
+        except ratelimit.RateLimited:
+            self.release()
+            raise
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # 协程超时、客户端断开等没有得到结果的情况，只归还探测名额
+                self.release()
+                raise
+            status = getattr(e, 'status_code', None)
+            if status is None or status >= 500 or status == 429:
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        else:
+            self.record_success()
+
+
+def is_failure_status(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_breaker(name, **config):
+    """获取上游对应的熔断器（首次使用时按 config 创建）"""
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **config)
+    return breaker
+
+
+@metrics.register_collector
+def _circuit_lines():
+    with _lock:
+        breakers = list(_breakers.values())
+    return metrics.gauge_lines('circuit_state', '熔断状态（0 正常，1 探测中，2 熔断）',
+                               [({'upstream': b.name}, STATE_VALUES[b.state]) for b in breakers])
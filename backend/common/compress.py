@@ -0,0 +1,90 @@
+# common/compress.py
+# 响应的条件请求和压缩：GET 响应带 ETag，If-None-Match 一致时返回 304；
+# 较大的响应按 Accept-Encoding 使用 brotli 或 gzip 压缩。流式响应（SSE、地图代理）不处理。
+
+import gzip
+import hashlib
+
+from flask import request
+
+from . import config
+
+# 小于该大小（字节）的响应不压缩，压缩收益抵不过开销
+COMPRESS_MIN_SIZE = config.get_int('COMPRESS_MIN_SIZE', 1024)
+GZIP_LEVEL = config.get_int('GZIP_LEVEL', 6)
+# brotli 质量 0~11，5 左右在速度和压缩率之间较平衡
+BROTLI_QUALITY = config.get_int('BROTLI_QUALITY', 5)
+COMPRESSIBLE_TYPES = {'application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript'}
+
+_brotli = None
+
+
+def brotli_module():
+    """brotli 为可选依赖，首次使用时导入，未安装时只使用 gzip"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if accepted['br'] and brotli_module() is not None:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def add_etag(response):
+    """
+    为 GET 响应计算弱 ETag（基于未压缩的响应体），客户端的 If-None-Match 一致时改为 304
+    没有缓存策略的响应加上 Cache-Control: no-cache，使浏览器每次都带 ETag 验证
+    """
+    data = response.get_data()
+    response.set_etag(hashlib.blake2b(data, digest_size=16).hexdigest(), weak=True)
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-cache'
+    response.make_conditional(request)
+
+
+def compress(response):
+    encoding = choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return
+    if encoding == 'br':
+        compressed = brotli_module().compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if len(compressed) >= len(data):
+        return
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # 强 ETag 表示字节完全相同，压缩后的响应体不同，已有的强 ETag（如上游返回的）改为弱 ETag
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_app(app):
+    """注册 ETag / 304 和压缩处理"""
+
+    @app.after_request
+    def _conditional_and_compress(response):
+        if response.is_streamed or response.direct_passthrough:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers:
+            return response
+        # 已有 ETag 的响应（如地图代理的缓存）由生成方自己处理条件请求
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and 'ETag' not in response.headers:
+            add_etag(response)
+        # 304 也带上 Vary，缓存按编码区分同一地址的不同表示
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 304:
+            compress(response)
+        return response
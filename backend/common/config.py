@@ -0,0 +1,62 @@
+# common/config.py
+# 统一的配置读取：.env 文件只在首次使用时加载一次，路径相对于 backend 目录而不是当前工作目录。
+# 环境变量优先于 .env 中的值。
+
+import os
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 依次读取的 .env 文件，前面的优先；仓库根目录的 .env 兼容旧的 '../.env' 写法
+ENV_FILES = (
+    os.path.join(BACKEND_DIR, '.env'),
+    os.path.join(os.path.dirname(BACKEND_DIR), '.env'),
+)
+
+_values = None
+# 实际读取到的 .env 文件
+loaded_files = []
+_lock = threading.Lock()
+
+
+def load(env_files=ENV_FILES):
+    """加载 .env 文件，只在第一次调用时生效"""
+    global _values
+    with _lock:
+        if _values is not None:
+            return
+        found = [path for path in env_files if os.path.isfile(path)]
+        values = {}
+        if found:
+            # python-dotenv 只在确实存在 .env 文件时导入
+            from dotenv import dotenv_values
+            for path in reversed(found):
+                values.update({k: v for k, v in dotenv_values(path).items() if v is not None})
+        loaded_files[:] = found
+        _values = values
+
+
+def get(key, default=None):
+    """读取配置：环境变量优先，其次是 .env 文件，都没有时返回 default"""
+    value = os.environ.get(key)
+    if value is not None:
+        return value
+    if _values is None:
+        load()
+    return _values.get(key, default)
+
+
+def get_int(key, default):
+    return int(get(key, default))
+
+
+def get_float(key, default):
+    return float(get(key, default))
+
+
+def get_bool(key, default):
+    """'0'、'false'、'no'、'off'（不区分大小写）和空字符串为 False"""
+    value = get(key)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
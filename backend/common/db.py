@@ -0,0 +1,34 @@
+# common/db.py
+# SQLite 连接工具：每个线程复用一个连接，统一开启 WAL 模式
+
+import os
+import sqlite3
+import threading
+
+from . import config
+
+# 本地数据目录（缓存、收藏等），可通过环境变量覆盖
+DATA_DIR = config.get('DATA_DIR', os.path.join(config.BACKEND_DIR, 'data'))
+
+_local = threading.local()
+
+
+def data_path(filename):
+    """返回数据目录下的文件路径，并确保目录存在"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+
+def get_connection(path):
+    """获取当前线程对应数据库文件的连接"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=10000')
+        connections[path] = conn
+    return conn
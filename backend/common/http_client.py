@@ -0,0 +1,286 @@
+# common/http_client.py
+# 上游服务的共享 HTTP 客户端：每个上游主机一个连接池（keep-alive），统一超时和带抖动的有限重试
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import circuit, config, metrics, ratelimit
+
+# 各上游服务的默认配置，均可通过环境变量覆盖，例如 AMAP_POOL_SIZE、TOMORROW_READ_TIMEOUT
+UPSTREAMS = {
+    # 高德 Web 服务 API（路线规划、地理编码等）
+    'amap': {'base_url': 'https://restapi.amap.com', 'pool_size': 32,
+             'connect_timeout': 3, 'read_timeout': 8, 'retries': 2},
+    # 高德自定义地图样式
+    'amap_webapi': {'base_url': 'https://webapi.amap.com', 'pool_size': 8,
+                    'connect_timeout': 3, 'read_timeout': 8, 'retries': 2},
+    # 高德海外矢量地图
+    'amap_fmap': {'base_url': 'https://fmap01.amap.com', 'pool_size': 8,
+                  'connect_timeout': 3, 'read_timeout': 8, 'retries': 2},
+    # tomorrow.io 天气预报
+    'tomorrow': {'base_url': 'https://api.tomorrow.io', 'pool_size': 8,
+                 'connect_timeout': 3, 'read_timeout': 10, 'retries': 2},
+    # DeepSeek（OpenAI 兼容接口）
+    'deepseek': {'base_url': 'https://api.deepseek.com', 'pool_size': 8,
+                 'connect_timeout': 5, 'read_timeout': 60, 'retries': 1},
+    # Moonshot / Kimi
+    'moonshot': {'base_url': 'https://api.moonshot.cn', 'pool_size': 8,
+                 'connect_timeout': 5, 'read_timeout': 60, 'retries': 1},
+}
+
+# 所有上游共用的默认配置：熔断阈值（连续失败次数）和熔断时长（秒），
+# 对冲请求的延迟分位数和最小延迟（秒），以及延迟样本不足时使用的延迟
+UPSTREAM_DEFAULTS = {
+    'circuit_failures': 5,
+    'circuit_reset': 30.0,
+    'hedge_quantile': 0.95,
+    'hedge_min_delay': 0.05,
+    'hedge_default_delay': 0.5,
+}
+# 计算对冲延迟所用的最近成功调用耗时样本数，以及开始使用样本所需的最少数量
+HEDGE_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+
+# 仅对这些状态码重试；POST 等非幂等请求只在连接建立前失败时重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_openai_clients = {}
+_lock = threading.Lock()
+# 各上游最近成功调用的耗时（秒），用于计算对冲延迟
+_latencies = {}
+# 每个对冲调用最多占用两个线程（主请求和对冲请求），协程模式下与 ROUTE_WORKERS 一起放宽（见 serve.py）
+hedge_executor = ThreadPoolExecutor(max_workers=config.get_int('HEDGE_WORKERS', 32), thread_name_prefix='hedge')
+
+upstream_hedges = metrics.Counter(
+    'upstream_hedges_total', '对冲请求（result 为 sent 表示发出了第二个请求，won 表示第二个请求先返回）',
+    ('upstream', 'result'))
+
+
+def upstream_config(name):
+    """读取上游配置，环境变量 <NAME>_<KEY> 优先"""
+    defaults = {**UPSTREAM_DEFAULTS, **UPSTREAMS[name]}
+    values = dict(defaults)
+    for key, default in defaults.items():
+        value = config.get(f"{name.upper()}_{key.upper()}")
+        if value is not None:
+            values[key] = type(default)(value)
+    return values
+
+
+def get_session(name):
+    """获取上游对应的共享 Session（首次使用时创建）"""
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _sessions[name] = _build_session(upstream_config(name))
+    return session
+
+
+def _build_session(settings):
+    retry = Retry(
+        total=settings['retries'],
+        connect=settings['retries'],
+        read=settings['retries'],
+        status=settings['retries'],
+        status_forcelist=RETRY_STATUS,
+        backoff_factor=0.2,
+        backoff_jitter=0.2,
+        backoff_max=2,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings['pool_size'],
+        max_retries=retry,
+        pool_block=False
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def build_url(name, path):
+    """path 可以是完整 URL，也可以是相对于上游 base_url 的路径"""
+    if path.startswith(('http://', 'https://')):
+        return path
+    return upstream_config(name)['base_url'].rstrip('/') + '/' + path.lstrip('/')
+
+
+def get_breaker(name):
+    settings = upstream_config(name)
+    return circuit.get_breaker(name, failure_threshold=settings['circuit_failures'],
+                               reset_timeout=settings['circuit_reset'])
+
+
+def request(name, method, path, quota=None, **kwargs):
+    """
+    向指定上游发送请求，未指定 timeout 时使用上游的连接/读取超时
+    上游熔断中时抛出 circuit.CircuitOpen；发送前按 quota（默认与上游同名）获取限流令牌，
+    被拒绝时抛出 ratelimit.RateLimited
+    """
+    return _send(name, method, path, quota, None, kwargs)
+
+
+def _send(name, method, path, quota, rate_wait, kwargs):
+    breaker = get_breaker(name)
+    breaker.allow()
+    recorded = False
+    try:
+        ratelimit.acquire(quota or name, rate_wait)
+        settings = upstream_config(name)
+        kwargs.setdefault('timeout', (settings['connect_timeout'], settings['read_timeout']))
+        started = time.perf_counter()
+        try:
+            response = get_session(name).request(method, build_url(name, path), **kwargs)
+        except requests.exceptions.RequestException as e:
+            recorded = True
+            breaker.record_failure()
+            metrics.record_upstream(name, type(e).__name__, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        recorded = True
+        if circuit.is_failure_status(response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            _record_latency(name, elapsed)
+        metrics.record_upstream(name, response.status_code, elapsed)
+        return response
+    finally:
+        # 没有得到结果（被限流拒绝或出现其他异常）时归还探测名额，否则半开状态会一直拒绝调用
+        if not recorded:
+            breaker.release()
+
+
+def _record_latency(name, seconds):
+    samples = _latencies.get(name)
+    if samples is None:
+        samples = _latencies.setdefault(name, deque(maxlen=HEDGE_SAMPLES))
+    samples.append(seconds)
+
+
+def request_timeout(name, kwargs):
+    """请求的总超时（秒）：调用方指定的 timeout，或上游的连接 + 读取超时"""
+    timeout = kwargs.get('timeout')
+    if timeout is None:
+        settings = upstream_config(name)
+        return settings['connect_timeout'] + settings['read_timeout']
+    return sum(timeout) if isinstance(timeout, tuple) else timeout
+
+
+def hedge_delay(name):
+    """对冲延迟：最近成功调用耗时的分位数（默认 p95），样本不足时使用默认值"""
+    settings = upstream_config(name)
+    samples = sorted(_latencies.get(name, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return settings['hedge_default_delay']
+    index = min(len(samples) - 1, int(settings['hedge_quantile'] * len(samples)))
+    return max(settings['hedge_min_delay'], samples[index])
+
+
+def hedged_get(name, path, quota=None, **kwargs):
+    """
+    对冲请求，只用于开销小的幂等 GET（如地理编码）：
+    第一个请求发出后超过 hedge_delay 仍未返回时再发一个相同的请求，取先成功返回的结果。
+    第二个请求拿不到限流令牌时不发，只等第一个请求
+    """
+    started = threading.Event()
+    started_at = []
+
+    def send_first():
+        started_at.append(time.perf_counter())
+        started.set()
+        return request(name, 'GET', path, quota, **kwargs)
+
+    try:
+        first = hedge_executor.submit(contextvars.copy_context().run, send_first)
+    except RuntimeError:
+        # 线程池已关闭（进程退出中），直接在当前线程发送
+        return request(name, 'GET', path, quota, **kwargs)
+    delay = hedge_delay(name)
+    # 主请求在线程池中排队的时间不计入对冲延迟：等它真正发出后再计时，
+    # 否则本地排队也会触发对冲，徒增上游压力。
+    # 线程池长时间占满时不再等待，取消排队中的请求，改在当前线程直接发送（不对冲）
+    if not started.wait(timeout=request_timeout(name, kwargs)) and first.cancel():
+        return request(name, 'GET', path, quota, **kwargs)
+    started.wait()
+    done, _ = wait([first], timeout=max(0.0, delay - (time.perf_counter() - started_at[0])))
+    if done:
+        return first.result()
+
+    try:
+        second = hedge_executor.submit(contextvars.copy_context().run, _send, name, 'GET', path, quota, 0, dict(kwargs))
+    except RuntimeError:
+        return first.result()
+    upstream_hedges.inc(name, 'sent')
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except requests.exceptions.RequestException as e:
+                error = error or e
+                continue
+            if future is second:
+                upstream_hedges.inc(name, 'won')
+            # 另一个请求返回后直接关闭，不再使用
+            for other in pending:
+                other.add_done_callback(_close_response)
+            return response
+    raise error
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def get(name, path, **kwargs):
+    return request(name, 'GET', path, **kwargs)
+
+
+def post(name, path, **kwargs):
+    return request(name, 'POST', path, **kwargs)
+
+
+def get_openai_client(name, api_key):
+    """获取 OpenAI 兼容接口的共享客户端（复用连接池），按上游和密钥缓存"""
+    cache_key = (name, api_key)
+    client = _openai_clients.get(cache_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _openai_clients.get(cache_key)
+        if client is None:
+            # openai 体积较大，只在首次使用时导入
+            import httpx
+            from openai import OpenAI
+
+            settings = upstream_config(name)
+            client = OpenAI(
+                api_key=api_key,
+                base_url=settings['base_url'],
+                max_retries=settings['retries'],
+                timeout=httpx.Timeout(settings['read_timeout'], connect=settings['connect_timeout']),
+                http_client=httpx.Client(limits=httpx.Limits(
+                    max_connections=settings['pool_size'],
+                    max_keepalive_connections=settings['pool_size']
+                ))
+            )
+            _openai_clients[cache_key] = client
+    return client
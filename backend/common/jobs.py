@@ -0,0 +1,134 @@
+# common/jobs.py
+# 后台任务队列：例如收藏景点或路线后预取坐标、天气和 AI 推荐，使之后的查询直接命中缓存。
+# 任务在固定大小的线程池中执行，其中的上游调用按后台优先级限流（让用户请求优先）；
+# 排队的任务过多时丢弃新任务。最近的任务状态可通过 /api/jobs 查看（每个进程各自维护）。
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify, request
+
+from . import config, metrics, ratelimit
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = config.get_bool('JOBS_ENABLED', True)
+JOB_WORKERS = config.get_int('JOB_WORKERS', 2)
+# 排队和执行中的任务数上限，超过时新任务直接丢弃
+JOB_QUEUE_SIZE = config.get_int('JOB_QUEUE_SIZE', 100)
+# 保留最近多少个任务的状态
+JOB_HISTORY = config.get_int('JOB_HISTORY', 200)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+DROPPED = 'dropped'
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+_jobs = OrderedDict()   # 任务编号 -> 任务状态
+_active = {}            # 任务 key -> 排队或执行中的任务
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+jobs_total = metrics.Counter(
+    'jobs_total', '结束的后台任务数（status 为 done、failed 或 dropped）', ('kind', 'status'))
+job_duration = metrics.Histogram(
+    'job_duration_seconds', '后台任务执行耗时（秒）', ('kind',))
+
+
+def submit(kind, key, func, *args):
+    """
+    提交后台任务 func(*args)，返回任务状态的副本
+    相同 key 的任务正在排队或执行时不重复提交，直接返回该任务；队列已满时任务状态为 dropped
+    """
+    with _lock:
+        job = _active.get(key)
+        if job is not None:
+            return dict(job)
+        job = {'id': next(_ids), 'kind': kind, 'key': key, 'status': QUEUED,
+               'createdAt': round(time.time(), 3), 'startedAt': None, 'finishedAt': None,
+               'result': None, 'error': None}
+        _jobs[job['id']] = job
+        while len(_jobs) > JOB_HISTORY:
+            _jobs.popitem(last=False)
+        if not JOBS_ENABLED or len(_active) >= JOB_QUEUE_SIZE:
+            job['status'] = DROPPED
+            job['finishedAt'] = job['createdAt']
+            jobs_total.inc(kind, DROPPED)
+            return dict(job)
+        _active[key] = job
+    job_executor.submit(_run, job, ratelimit.background(func), args)
+    return dict(job)
+
+
+def _run(job, func, args):
+    with _lock:
+        job['status'] = RUNNING
+        job['startedAt'] = round(time.time(), 3)
+    started = time.perf_counter()
+    try:
+        result, error, status = func(*args), None, DONE
+    except Exception as e:
+        logger.warning("后台任务失败", extra={'kind': job['kind'], 'key': job['key'], 'error': str(e)})
+        result, error, status = None, str(e), FAILED
+    job_duration.observe(time.perf_counter() - started, job['kind'])
+    jobs_total.inc(job['kind'], status)
+    with _lock:
+        job.update(status=status, result=result, error=error, finishedAt=round(time.time(), 3))
+        _active.pop(job['key'], None)
+
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs(status=None, kind=None, limit=50):
+    """最近的任务，新任务在前"""
+    with _lock:
+        jobs = [dict(job) for job in reversed(_jobs.values())
+                if (status is None or job['status'] == status) and (kind is None or job['kind'] == kind)]
+    return jobs[:limit]
+
+
+def counts():
+    with _lock:
+        running = sum(1 for job in _active.values() if job['status'] == RUNNING)
+        return {QUEUED: len(_active) - running, RUNNING: running}
+
+
+@metrics.register_collector
+def _job_lines():
+    return metrics.gauge_lines('jobs_active', '排队和执行中的后台任务数',
+                               [({'status': status}, n) for status, n in counts().items()])
+
+
+def init_app(app):
+    """注册任务状态接口 /api/jobs 和 /api/jobs/<id>"""
+
+    @app.route('/api/jobs', methods=['GET'])
+    def jobs():
+        # 可选参数：?status=&kind=&limit=
+        try:
+            limit = max(0, min(int(request.args.get('limit', 50)), JOB_HISTORY))
+        except ValueError:
+            return jsonify({'error': 'limit 参数不正确'}), 400
+        return jsonify({
+            'jobs': list_jobs(request.args.get('status'), request.args.get('kind'), limit),
+            'workers': JOB_WORKERS,
+            **counts(),
+        })
+
+    @app.route('/api/jobs/<int:job_id>', methods=['GET'])
+    def job(job_id):
+        found = get_job(job_id)
+        if found is None:
+            return jsonify({'error': '任务不存在或已过期'}), 404
+        return jsonify(found)
@@ -0,0 +1,43 @@
+# common/log.py
+# 结构化日志：每条日志输出为一行 JSON，额外字段通过 logger.xxx(..., extra={...}) 传入
+
+import json
+import logging
+import sys
+import time
+
+from . import config
+
+# LogRecord 自带的属性，其余属性视为 extra 字段
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """配置根日志输出到 stderr（JSON 格式），日志级别由 LOG_LEVEL 控制；重复调用无副作用"""
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+    _configured = True
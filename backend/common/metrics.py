@@ -0,0 +1,168 @@
+# common/metrics.py
+# 轻量的 Prometheus 指标：接口延迟直方图、上游调用次数/延迟/错误码、缓存命中率，
+# 通过 /metrics 以 Prometheus 文本格式输出
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+# 在输出时才读取数值的指标（缓存统计、限流余量等），每项为返回文本行列表的函数
+_collectors = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label_values -> [各桶计数..., 总和, 总数]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            data = self._values.get(label_values)
+            if data is None:
+                data = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, data in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, [('le', '+Inf')])} {data[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {round(data[-2], 6)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {data[-1]}")
+        return lines
+
+
+def gauge_lines(name, help_text, samples):
+    """把 [(labels_dict, value), ...] 格式化为 gauge 文本"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+    return lines
+
+
+def register_collector(func):
+    _collectors.append(func)
+    return func
+
+
+# ---------- 预定义指标 ----------
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', '接口处理耗时', ('endpoint', 'method', 'status'))
+upstream_requests = Counter(
+    'upstream_requests_total', '上游调用次数（status 为 HTTP 状态码或异常类型）', ('upstream', 'status'))
+upstream_request_duration = Histogram(
+    'upstream_request_duration_seconds', '上游调用耗时（流式响应只统计到收到响应头）', ('upstream',))
+upstream_errors = Counter(
+    'upstream_errors_total', '上游返回的业务错误（如高德 infocode）', ('upstream', 'code'))
+
+
+def record_upstream(upstream, status, seconds):
+    upstream_requests.inc(upstream, str(status))
+    upstream_request_duration.observe(seconds, upstream)
+
+
+@contextmanager
+def observe_upstream(upstream):
+    """统计不经过 http_client 的上游调用（如 OpenAI SDK）"""
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        record_upstream(upstream, status, time.perf_counter() - started)
+
+
+@register_collector
+def _cache_lines():
+    from .cache import all_caches
+    caches = [cache.stats() for cache in all_caches()]
+    lines = []
+    for metric, key, help_text in (
+        ('cache_hits_total', 'hits', '缓存命中次数'),
+        ('cache_misses_total', 'misses', '缓存未命中次数'),
+        ('cache_stale_total', 'stale', '返回过期缓存的次数'),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(f'{metric}{{cache="{s["name"]}"}} {s[key]}' for s in caches)
+    lines.extend(gauge_lines('cache_hit_ratio', '缓存命中率', [({'cache': s['name']}, s['hit_ratio']) for s in caches]))
+    lines.extend(gauge_lines('cache_entries', '内存中的缓存条目数', [({'cache': s['name']}, s['size']) for s in caches]))
+    return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """注册接口耗时统计和 /metrics 接口"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_duration.observe(time.perf_counter() - started,
+                                          endpoint, request.method, str(response.status_code))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,273 @@
+# common/ratelimit.py
+# 按 API 密钥（配额）划分的令牌桶限流：限制每秒请求数和每日总量，
+# 交互请求优先于后台任务；预计在截止时间内拿不到令牌的请求直接拒绝，不再发给上游。
+# 令牌桶在各进程内存中，多进程部署时每秒请求数和桶容量按 RATE_LIMIT_PROCESSES 平分；
+# 每日用量记在共享的 SQLite 中，所有进程合计，重启后不清零。
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+
+import requests
+
+from . import config, metrics
+from .db import data_path, get_connection
+
+logger = logging.getLogger(__name__)
+
+# 各配额的默认值，均可通过环境变量覆盖，例如 AMAP_RATE、TOMORROW_DAILY_QUOTA
+#   rate：每秒补充的令牌数；burst：桶容量；daily_quota：每日总量，0 表示不限
+#   reserve：为交互请求保留的桶容量比例，后台任务不能使用这部分令牌
+QUOTAS = {
+    # 高德 Web 服务（后端密钥 AMAP_BACKEND_KEY）
+    'amap': {'rate': 30.0, 'burst': 30, 'daily_quota': 0, 'reserve': 0.5},
+    # 高德 Web 服务代理（前端密钥），与后端密钥分开计算
+    'amap_js': {'rate': 30.0, 'burst': 30, 'daily_quota': 0, 'reserve': 0.5},
+    # tomorrow.io 免费版为 3 次/秒、500 次/天
+    'tomorrow': {'rate': 3.0, 'burst': 3, 'daily_quota': 0, 'reserve': 0.5},
+    'deepseek': {'rate': 5.0, 'burst': 10, 'daily_quota': 0, 'reserve': 0.5},
+    'moonshot': {'rate': 1.0, 'burst': 3, 'daily_quota': 0, 'reserve': 0.5},
+}
+
+# 设为 0 时关闭限流（如离线压测）
+RATE_LIMIT_ENABLED = config.get_bool('RATE_LIMIT_ENABLED', True)
+# 共用同一组密钥的进程数（如 gunicorn 的 worker 数），默认取 gunicorn 也使用的 WEB_CONCURRENCY
+RATE_LIMIT_PROCESSES = max(1, config.get_int('RATE_LIMIT_PROCESSES', config.get_int('WEB_CONCURRENCY', 1)))
+# 每日用量（各进程共享）
+USAGE_PATH = data_path('ratelimit.sqlite3')
+# 各优先级最多排队等待的时间（秒）
+MAX_WAIT = {
+    'interactive': config.get_float('RATE_LIMIT_INTERACTIVE_WAIT', 2),
+    'background': config.get_float('RATE_LIMIT_BACKGROUND_WAIT', 30),
+}
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_priority = ContextVar('ratelimit_priority', default=INTERACTIVE)
+
+rate_limited = metrics.Counter(
+    'ratelimit_rejected_total', '被限流拒绝的上游调用（reason 为 deadline 或 quota）', ('quota', 'priority', 'reason'))
+rate_limit_wait = metrics.Histogram(
+    'ratelimit_wait_seconds', '等待令牌的时间', ('quota', 'priority'),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+
+
+class RateLimited(requests.exceptions.RequestException):
+    """限流拒绝；继承 RequestException，调用方按上游请求失败处理"""
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _usage_db():
+    global _schema_ready
+    conn = get_connection(USAGE_PATH)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS daily_usage ('
+                    ' quota TEXT NOT NULL,'
+                    ' day TEXT NOT NULL,'
+                    ' used INTEGER NOT NULL,'
+                    ' PRIMARY KEY (quota, day))'
+                )
+                _schema_ready = True
+    return conn
+
+
+def take_daily(name, day, limit):
+    """当日用量加一，成功返回 True；已达到 limit 时不修改并返回 False（多进程下原子执行）"""
+    cursor = _usage_db().execute(
+        'INSERT INTO daily_usage (quota, day, used) VALUES (?, ?, 1) '
+        'ON CONFLICT (quota, day) DO UPDATE SET used = used + 1 WHERE used < ?',
+        (name, day.isoformat(), limit))
+    return cursor.rowcount > 0
+
+
+def daily_used(name, day):
+    row = _usage_db().execute(
+        'SELECT used FROM daily_usage WHERE quota = ? AND day = ?', (name, day.isoformat())).fetchone()
+    return row[0] if row else 0
+
+
+class TokenBucket:
+    def __init__(self, name, rate, burst, daily_quota=0, reserve=0.5):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.daily_quota = int(daily_quota)
+        self.reserve = float(reserve)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        # 已知当日配额用尽的日期，之后的请求不再查询数据库
+        self._exhausted_on = None
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        获取一个令牌，成功返回等待的秒数；超过截止时间或每日配额用尽时抛出 RateLimited
+        后台任务只能使用保留部分以外的令牌，并且在有交互请求排队时让行
+        """
+        timeout = MAX_WAIT[priority] if timeout is None else timeout
+        with self._cond:
+            started = now = self._refill()
+            deadline = started + timeout
+            floor = self.floor(priority)
+            # 桶容量不足以在保留部分之外再放出一个令牌时永远等不到，直接拒绝
+            if 1 + floor > self.burst:
+                self._reject(priority, 'deadline')
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    if self.daily_quota and self._exhausted_on == date.today():
+                        self._reject(priority, 'quota')
+                    yielding = priority == BACKGROUND and self._waiting[INTERACTIVE] > 0
+                    if not yielding and self._tokens - floor >= 1:
+                        if self.daily_quota and not self._take_daily():
+                            self._exhausted_on = date.today()
+                            self._reject(priority, 'quota')
+                        self._tokens -= 1
+                        return now - started
+                    # 按补充速度估算需要等待多久，等不到就立即拒绝，不白白占用请求
+                    needed = max(0.0, 1 + floor - self._tokens) / self.rate if self.rate else float('inf')
+                    if now + needed > deadline:
+                        self._reject(priority, 'deadline')
+                    self._cond.wait(min(max(needed, 0.005), deadline - now))
+                    now = self._refill()
+            finally:
+                self._waiting[priority] -= 1
+                # 唤醒其他等待者重新判断（如交互请求离开后后台任务可以继续）
+                self._cond.notify_all()
+
+    def floor(self, priority):
+        """
+        该优先级不能使用的令牌数：后台任务不使用为交互请求保留的部分，
+        但至少留出一个令牌的余量（多进程平分后桶容量可能只有 1~2 个令牌）
+        """
+        if priority == INTERACTIVE:
+            return 0.0
+        return min(self.burst * self.reserve, max(0.0, self.burst - 1))
+
+    def _take_daily(self):
+        try:
+            return take_daily(self.name, date.today(), self.daily_quota)
+        except sqlite3.Error as e:
+            # 用量记录失败时不阻塞请求，只少计一次
+            logger.warning("限流每日用量记录失败", extra={'quota': self.name, 'error': str(e)})
+            return True
+
+    def _reject(self, priority, reason):
+        rate_limited.inc(self.name, priority, reason)
+        message = '每日配额已用尽' if reason == 'quota' else '请求过多，超过限流等待时间'
+        raise RateLimited(f"{self.name}: {message}")
+
+    def stats(self):
+        with self._cond:
+            self._refill()
+            return {
+                'name': self.name,
+                'tokens': round(self._tokens, 2),
+                'burst': self.burst,
+                'rate': self.rate,
+                'daily_quota': self.daily_quota,
+                'daily_remaining': self._daily_remaining(),
+                'waiting': dict(self._waiting),
+            }
+
+
+    def _daily_remaining(self):
+        if not self.daily_quota:
+            return None
+        try:
+            return max(0, self.daily_quota - daily_used(self.name, date.today()))
+        except sqlite3.Error:
+            return None
+
+
+_buckets = {}
+_lock = threading.Lock()
+
+
+def quota_config(name):
+    """
+    读取配额配置，环境变量 <NAME>_<KEY> 优先
+    rate 和 burst 为所有进程合计的值，返回本进程分得的部分；daily_quota 由各进程共享，不拆分
+    """
+    values = dict(QUOTAS[name])
+    for key, default in QUOTAS[name].items():
+        value = config.get(f"{name.upper()}_{key.upper()}")
+        if value is not None:
+            values[key] = type(default)(value)
+    values['rate'] = values['rate'] / RATE_LIMIT_PROCESSES
+    values['burst'] = max(1, values['burst'] / RATE_LIMIT_PROCESSES)
+    return values
+
+
+def get_bucket(name):
+    bucket = _buckets.get(name)
+    if bucket is not None:
+        return bucket
+    with _lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = _buckets[name] = TokenBucket(name, **quota_config(name))
+    return bucket
+
+
+def acquire(name, timeout=None):
+    """在调用上游前获取令牌；没有配置配额的上游（如静态地图资源）不限流"""
+    if not RATE_LIMIT_ENABLED or name not in QUOTAS:
+        return
+    priority = _priority.get()
+    waited = get_bucket(name).acquire(priority, timeout)
+    rate_limit_wait.observe(waited, name, priority)
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def priority(level):
+    """在此范围内发出的上游调用使用指定优先级（线程池中的任务需要在任务内部设置）"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def background(func):
+    """包装提交到线程池的后台任务，使其中的上游调用按后台优先级限流"""
+    def run(*args, **kwargs):
+        with priority(BACKGROUND):
+            return func(*args, **kwargs)
+    return run
+
+
+@metrics.register_collector
+def _ratelimit_lines():
+    stats = [get_bucket(name).stats() for name in QUOTAS] if RATE_LIMIT_ENABLED else []
+    lines = metrics.gauge_lines('ratelimit_tokens_available', '当前可用令牌数',
+                                [({'quota': s['name']}, s['tokens']) for s in stats])
+    lines.extend(metrics.gauge_lines('ratelimit_daily_remaining', '今日剩余配额（仅统计设置了每日配额的密钥）',
+                                     [({'quota': s['name']}, s['daily_remaining']) for s in stats
+                                      if s['daily_remaining'] is not None]))
+    lines.extend(metrics.gauge_lines('ratelimit_waiting', '排队等待令牌的请求数',
+                                     [({'quota': s['name'], 'priority': p}, n) for s in stats
+                                      for p, n in s['waiting'].items()]))
+    return lines
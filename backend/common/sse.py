@@ -0,0 +1,34 @@
+# common/sse.py
+# Server-Sent Events 工具：把生成器包装成 text/event-stream 响应
+
+import json
+
+from flask import Response, request, stream_with_context
+
+
+def wants_stream(data=None):
+    """请求是否选择了流式返回：?stream=1 或 JSON 中 "stream": true"""
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return bool(data) and data.get('stream') is True
+
+
+def sse_event(data, event=None):
+    """格式化一条 SSE 消息，data 为可 JSON 序列化的对象"""
+    message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{message}" if event else message
+
+
+def sse_response(events):
+    """
+    返回流式响应；客户端断开时 WSGI 服务器会关闭生成器，
+    生成器应在 finally 中释放上游连接
+    """
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止 nginx 缓冲
+        }
+    )
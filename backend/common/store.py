@@ -0,0 +1,117 @@
+# common/store.py
+# 收藏景点和收藏路线的持久化存储（SQLite，WAL 模式），多个 worker 进程共享同一份数据
+
+import json
+import sqlite3
+import threading
+
+from .db import data_path, get_connection
+
+STORE_PATH = data_path('store.sqlite3')
+# 分页时单页最多返回的条数
+MAX_PAGE_SIZE = 500
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _db():
+    global _schema_ready
+    conn = get_connection(STORE_PATH)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS saved_spots ('
+                    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                    ' name TEXT NOT NULL UNIQUE)'
+                )
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS saved_routes ('
+                    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                    ' data TEXT NOT NULL)'
+                )
+                _schema_ready = True
+    return conn
+
+
+def _page(sql, params, limit=None, offset=0):
+    """在查询语句后追加分页条件"""
+    if limit is None:
+        return sql, params
+    return sql + ' LIMIT ? OFFSET ?', params + (limit, offset)
+
+
+# ---------- 收藏景点 ----------
+
+def list_spots(limit=None, offset=0):
+    """返回 (景点列表, 总数)，limit 为空时返回全部"""
+    conn = _db()
+    sql, params = _page('SELECT id, name FROM saved_spots ORDER BY id', (), limit, offset)
+    spots = [{'id': row[0], 'name': row[1]} for row in conn.execute(sql, params)]
+    total = conn.execute('SELECT COUNT(*) FROM saved_spots').fetchone()[0]
+    return spots, total
+
+
+def get_spot(spot_id):
+    row = _db().execute('SELECT id, name FROM saved_spots WHERE id = ?', (spot_id,)).fetchone()
+    return {'id': row[0], 'name': row[1]} if row else None
+
+
+def find_spot(name):
+    row = _db().execute('SELECT id, name FROM saved_spots WHERE name = ?', (name,)).fetchone()
+    return {'id': row[0], 'name': row[1]} if row else None
+
+
+def add_spot(name):
+    """新增景点，同名景点已存在时返回 None（由唯一索引保证）"""
+    try:
+        cursor = _db().execute('INSERT INTO saved_spots (name) VALUES (?)', (name,))
+    except sqlite3.IntegrityError:
+        return None
+    return {'id': cursor.lastrowid, 'name': name}
+
+
+def delete_spot(spot_id):
+    _db().execute('DELETE FROM saved_spots WHERE id = ?', (spot_id,))
+
+
+# ---------- 收藏路线 ----------
+
+def list_routes(limit=None, offset=0):
+    """返回 (路线列表, 总数)，limit 为空时返回全部"""
+    conn = _db()
+    sql, params = _page('SELECT id, data FROM saved_routes ORDER BY id', (), limit, offset)
+    routes = [{'id': row[0], **json.loads(row[1])} for row in conn.execute(sql, params)]
+    total = conn.execute('SELECT COUNT(*) FROM saved_routes').fetchone()[0]
+    return routes, total
+
+
+def get_route(route_id):
+    row = _db().execute('SELECT id, data FROM saved_routes WHERE id = ?', (route_id,)).fetchone()
+    return {'id': row[0], **json.loads(row[1])} if row else None
+
+
+def add_route(route_data):
+    """新增路线，返回带 id 的路线数据"""
+    cursor = _db().execute(
+        'INSERT INTO saved_routes (data) VALUES (?)',
+        (json.dumps(route_data, ensure_ascii=False),)
+    )
+    return {'id': cursor.lastrowid, **route_data}
+
+
+def delete_route(route_id):
+    _db().execute('DELETE FROM saved_routes WHERE id = ?', (route_id,))
+
+
+def parse_pagination(args):
+    """解析 ?limit=&offset= 分页参数，未提供 limit 时返回 (None, 0)；参数不合法时抛出 ValueError"""
+    limit = args.get('limit')
+    offset = int(args.get('offset') or 0)
+    if limit in (None, ''):
+        return None, offset
+    limit = int(limit)
+    if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+        raise ValueError('pagination out of range')
+    return limit, offset
@@ -0,0 +1,36 @@
+# backend/serve.py
+# 协程模式启动入口：使用 gevent 把网络 I/O 变为非阻塞，
+# 一个进程即可同时处理数百个等待高德、tomorrow.io、DeepSeek、Moonshot 响应的请求，
+# 路由和 JSON 格式与 app.py 完全相同。
+#
+#   python serve.py                                         # 单进程
+#   gunicorn -k gevent --worker-connections 1000 serve:app  # 多进程（Linux）
+
+# 必须在导入 requests / socket / threading 等模块之前打补丁
+from gevent import monkey
+monkey.patch_all()
+
+import logging
+import os
+
+# 协程模式下线程池中的任务是轻量的 greenlet，可以放宽并发上限
+os.environ.setdefault('ROUTE_WORKERS', '256')
+# 对冲请求的线程池：每个地理编码最多占用主请求和对冲请求两个
+os.environ.setdefault('HEDGE_WORKERS', '512')
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from app import create_combined_app
+
+app = create_combined_app()
+logger = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    host = os.getenv('HOST', '127.0.0.1')
+    port = int(os.getenv('PORT', '5000'))
+    # 同时处理的连接数上限
+    max_connections = int(os.getenv('MAX_CONNECTIONS', '1000'))
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections))
+    logger.info("gevent 服务已启动", extra={'host': host, 'port': port, 'max_connections': max_connections})
+    server.serve_forever()
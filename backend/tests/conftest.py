@@ -0,0 +1,8 @@
+# tests/conftest.py
+# 测试使用临时数据目录，不访问真实的上游接口
+
+import os
+import tempfile
+
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='backend-tests-')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
@@ -0,0 +1,43 @@
+import pytest
+import requests
+from flask import Flask
+
+from weather.app import routes
+
+
+class FailingStream:
+    status_code = 502
+    closed = False
+
+    def raise_for_status(self):
+        raise requests.exceptions.HTTPError('502 Bad Gateway')
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('MOONSHOT_API_KEY', 'test')
+    app = Flask(__name__)
+    app.register_blueprint(routes.routes)
+    return app.test_client()
+
+
+def test_stream_error_closes_upstream_response(client, monkeypatch):
+    upstream = FailingStream()
+    monkeypatch.setattr(routes.http_client, 'post', lambda *args, **kwargs: upstream)
+    weather = [{'time': '2026-10-18T00:00:00Z', 'temperature': 21.5, 'precipitationProbability': 10}]
+    response = client.post('/api/advice', json={'weather': weather, 'stream': True})
+    assert response.status_code == 500
+    assert upstream.closed
+
+
+def test_prompt_uses_only_quantized_values():
+    weather = [{'time': '2026-10-18T00:00:00Z', 'temperature': 23.4, 'precipitationProbability': 12},
+               {'time': '2026-10-18T01:00:00Z', 'temperature': 24.9, 'precipitationProbability': 19}]
+    buckets = routes.advice_buckets(weather)
+    prompt = routes.build_advice_prompt(buckets)
+    assert len(buckets) == 1
+    assert '20~25℃' in prompt and '低于20%' in prompt
+    assert '23.4' not in prompt and '2026' not in prompt
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from common import cache
+from common.cache import SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, 'time', fake)
+    return fake
+
+
+def test_lookup_hit_stale_miss(clock):
+    entries = TTLCache('test_lookup', ttl=10, stale_ttl=20)
+    assert entries.lookup('a') == (None, 'miss')
+    entries.set('a', 1)
+    assert entries.lookup('a') == (1, 'hit')
+    clock.now += 15
+    assert entries.lookup('a') == (1, 'stale')
+    # get() 不返回过期值
+    assert entries.get('a') is None
+    clock.now += 20
+    assert entries.lookup('a') == (None, 'miss')
+    stats = entries.stats()
+    assert (stats['hits'], stats['stale'], stats['misses']) == (1, 1, 3)
+
+
+def test_persistent_entries_survive_a_new_instance(clock, tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    TTLCache('test_persist', ttl=10, db_path=db_path).set('a', {'x': 1})
+    reloaded = TTLCache('test_persist', ttl=10, db_path=db_path)
+    assert reloaded.lookup('a') == ({'x': 1}, 'hit')
+    clock.now += 11
+    assert TTLCache('test_persist', ttl=10, db_path=db_path).lookup('a') == (None, 'miss')
+
+
+def test_lru_eviction():
+    entries = TTLCache('test_lru', ttl=60, maxsize=2)
+    entries.set('a', 1)
+    entries.set('b', 2)
+    entries.get('a')
+    entries.set('c', 3)
+    assert entries.get('b') is None
+    assert entries.get('a') == 1 and entries.get('c') == 3
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(1)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 5
+    assert len(calls) == 1
@@ -0,0 +1,82 @@
+import pytest
+
+from common import circuit
+from common.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit, 'time', fake)
+    return fake
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # 探测请求未结束前，其他调用仍被拒绝
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 5
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+
+def test_guard_counts_server_errors_but_not_client_errors(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+
+    class ClientError(Exception):
+        status_code = 400
+
+    with pytest.raises(ClientError):
+        with breaker.guard():
+            raise ClientError()
+    assert breaker.state == CLOSED
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError()
+    assert breaker.state == OPEN
@@ -0,0 +1,43 @@
+import gzip
+
+from flask import Flask, Response
+
+from common import compress
+
+
+def make_app(etag=None):
+    app = Flask(__name__)
+    compress.init_app(app)
+
+    @app.route('/data')
+    def data():
+        response = Response('{"value": "%s"}' % ('x' * 4096), mimetype='application/json')
+        if etag is not None:
+            response.headers['ETag'] = etag
+        return response
+
+    return app
+
+
+def test_upstream_strong_etag_weakened_when_compressed():
+    client = make_app('"abc"').test_client()
+    response = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == 'W/"abc"'
+    assert gzip.decompress(response.data).startswith(b'{"value"')
+
+
+def test_upstream_etag_kept_without_compression():
+    client = make_app('"abc"').test_client()
+    response = client.get('/data', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == '"abc"'
+
+
+def test_generated_etag_is_weak_and_conditional():
+    client = make_app().test_client()
+    first = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    second = client.get('/data', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert second.status_code == 304
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from transport import gazetteer
+from transport.gazetteer import Gazetteer
+
+
+@pytest.fixture
+def index():
+    return Gazetteer.build([
+        ('广州市', '广州南站', '113.269', '22.988', None),
+        ('广州', '广州站', '113.257', '23.149', None),
+        ('广州', '广州东站', '113.325', '23.151', 'station'),
+        ('广州', '广州白云国际机场', '113.299', '23.392', None),
+        ('广州', '广州塔', '113.324', '23.106', None),
+        ('上海', '上海站', '121.455', '31.249', None),
+        ('上', '上清宫', '1', '1', None),
+    ])
+
+
+def test_lookup_normalizes_city_and_place(index):
+    assert index.lookup('广州', '广州南站') == '113.269000,22.988000'
+    assert index.lookup('广州市', ' 广州南站 ') == '113.269000,22.988000'
+    assert index.lookup('广州', '广州南') is None
+    assert index.lookup('深圳', '广州南站') is None
+
+
+def test_kinds_are_guessed_or_given(index):
+    kinds = {item['name']: item['kind'] for item in index.complete('广州', '广州', limit=10)}
+    assert kinds['广州南站'] == 'station'
+    assert kinds['广州白云国际机场'] == 'airport'
+    assert kinds['广州塔'] == 'poi'
+
+
+def test_complete_prefers_shorter_names(index):
+    names = [item['name'] for item in index.complete('广州', '广州', limit=3)]
+    assert names[:2] == sorted(['广州站', '广州塔']) and names[2] in ('广州南站', '广州东站')
+
+
+def test_complete_prefix_edge_cases(index):
+    # 完整名称本身也是前缀
+    assert [item['name'] for item in index.complete('广州', '广州塔')] == ['广州塔']
+    # 超出所有键的前缀、其他城市
+    assert index.complete('广州', '广州塔塔') == []
+    assert index.complete('深圳', '广州') == []
+    # 城市名是另一城市名的前缀时不串城
+    assert [item['name'] for item in index.complete('上', '上')] == ['上清宫']
+    # 字典序排在最后的键
+    assert [item['name'] for item in index.complete('广州市', '广州白')] == ['广州白云国际机场']
+    assert index.complete('广州', '广州', limit=0) == []
+
+
+def test_empty_index():
+    empty = Gazetteer()
+    assert empty.lookup('广州', '广州站') is None
+    assert empty.complete('广州', '广州') == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    path = str(tmp_path / 'gazetteer.bin')
+    index.save(path)
+    loaded = Gazetteer.load(path)
+    assert loaded.keys == index.keys
+    assert loaded.names == index.names
+    assert loaded.lookup('广州', '广州东站') == index.lookup('广州', '广州东站')
+    assert len(Gazetteer.load(str(tmp_path / 'missing.bin'))) == 0
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'XXXX' + bytes(12))
+    with pytest.raises(ValueError):
+        Gazetteer.load(str(path))
+
+
+def test_load_default_builds_from_seed(tmp_path, monkeypatch):
+    path = str(tmp_path / 'gazetteer.bin')
+    monkeypatch.setattr(gazetteer, 'default_path', lambda: path)
+    index = gazetteer.load_default()
+    assert os.path.isfile(path)
+    assert index.lookup('广州', '广州南站') is not None
+    assert index.complete('上海', '上海虹桥')
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import http_client
+
+
+class FakeResponse:
+    status_code = 200
+
+    def close(self):
+        pass
+
+
+def test_hedged_get_falls_back_when_the_pool_is_saturated(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    blocker = threading.Event()
+    pool.submit(blocker.wait)
+    monkeypatch.setattr(http_client, 'hedge_executor', pool)
+    calls = []
+
+    def fake_request(name, method, path, quota=None, **kwargs):
+        calls.append(threading.current_thread())
+        return FakeResponse()
+
+    monkeypatch.setattr(http_client, 'request', fake_request)
+    started = time.monotonic()
+    response = http_client.hedged_get('amap', '/v3/geocode/geo', timeout=0.2)
+    assert isinstance(response, FakeResponse)
+    assert time.monotonic() - started < 1
+    # 排队中的主请求已取消，改在调用方线程发送
+    assert calls == [threading.current_thread()]
+    blocker.set()
+    pool.shutdown()
+
+
+def test_hedged_get_falls_back_when_the_pool_is_shut_down(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    pool.shutdown()
+    monkeypatch.setattr(http_client, 'hedge_executor', pool)
+    monkeypatch.setattr(http_client, 'request', lambda *args, **kwargs: FakeResponse())
+    assert isinstance(http_client.hedged_get('amap', '/v3/geocode/geo'), FakeResponse)
+
+
+def test_half_open_probe_is_released_when_the_call_raises_something_else(monkeypatch):
+    from common import circuit, ratelimit
+
+    breaker = circuit.CircuitBreaker('probe_test', failure_threshold=1, reset_timeout=0)
+    monkeypatch.setattr(http_client, 'get_breaker', lambda name: breaker)
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+
+    def rate_limited(name, timeout=None):
+        raise ratelimit.RateLimited('limited')
+
+    monkeypatch.setattr(ratelimit, 'acquire', rate_limited)
+    for _ in range(2):
+        try:
+            http_client.request('amap', 'GET', '/x')
+        except ratelimit.RateLimited:
+            pass
+
+    def broken_session(name):
+        raise ValueError('bad config')
+
+    monkeypatch.setattr(ratelimit, 'acquire', lambda name, timeout=None: None)
+    monkeypatch.setattr(http_client, 'get_session', broken_session)
+    for _ in range(2):
+        try:
+            http_client.request('amap', 'GET', '/x')
+        except ValueError:
+            pass
+    # 以上调用都没有得到结果，探测名额已归还，下一个调用仍可以作为探测请求发出
+    breaker.allow()
+    assert breaker.state == circuit.HALF_OPEN
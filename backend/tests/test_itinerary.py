@@ -0,0 +1,74 @@
+import itertools
+import random
+
+import pytest
+
+from transport import itinerary, transport
+
+
+def brute_force(cost, start, return_to_start):
+    others = [i for i in range(len(cost)) if i != start]
+    return min(itinerary.path_cost(cost, [start, *order], return_to_start)
+               for order in itertools.permutations(others))
+
+
+def random_locations(rng, n):
+    return [f"{113 + rng.random() * 0.3:.6f},{23 + rng.random() * 0.3:.6f}" for _ in range(n)]
+
+
+@pytest.mark.parametrize('n', range(2, 9))
+@pytest.mark.parametrize('return_to_start', [False, True])
+def test_solve_order_is_optimal(n, return_to_start):
+    rng = random.Random(n)
+    # 非对称代价（如单行道）
+    cost = [[0 if i == j else rng.uniform(1, 100) for j in range(n)] for i in range(n)]
+    start = rng.randrange(n)
+    order = itinerary.solve_order(cost, start, return_to_start)
+    assert order[0] == start and sorted(order) == list(range(n))
+    assert itinerary.path_cost(cost, order, return_to_start) == pytest.approx(brute_force(cost, start, return_to_start))
+
+
+def test_improve_never_makes_the_order_worse():
+    rng = random.Random(7)
+    n = 30
+    cost = [[0 if i == j else rng.uniform(1, 100) for j in range(n)] for i in range(n)]
+    initial = itinerary.nearest_neighbor(cost, 0)
+    improved = itinerary.improve(cost, list(initial))
+    assert improved[0] == 0 and sorted(improved) == list(range(n))
+    assert itinerary.path_cost(cost, improved) <= itinerary.path_cost(cost, initial)
+
+
+@pytest.mark.parametrize('n', range(3, 9))
+@pytest.mark.parametrize('round_trip', [False, True])
+def test_order_itinerary_is_optimal(monkeypatch, n, round_trip):
+    rng = random.Random(100 + n)
+    locations = random_locations(rng, n)
+    coords = [itinerary.parse_location(location) for location in locations]
+    queried = []
+
+    def fake_route(mode, city, origin, destination, departure_time=None):
+        queried.append((origin, destination))
+        a, b = coords[locations.index(origin)], coords[locations.index(destination)]
+        return {'status': 'success', 'duration': itinerary.haversine_km(a, b) * 3, 'distance': 0}
+
+    monkeypatch.setattr(transport, 'fetch_mode_route', fake_route)
+    result = transport.order_itinerary('广州', 'driving', locations, start=0, round_trip=round_trip)
+
+    true_cost = [[itinerary.haversine_km(a, b) * 3 for b in coords] for a in coords]
+    order = result['order']
+    assert order[0] == 0 and sorted(order) == list(range(n))
+    assert itinerary.path_cost(true_cost, order, round_trip) == pytest.approx(brute_force(true_cost, 0, round_trip))
+    assert all(not leg['estimated'] for leg in result['legs'])
+    assert result['queries'] == len(set(queried))
+
+
+@pytest.mark.parametrize('start', [True, False, '1', 1.0, -1, 5])
+def test_itinerary_endpoint_rejects_invalid_start(start):
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.register_blueprint(transport.transport_bp)
+    response = app.test_client().post('/api/transport/itinerary', json={
+        'city': '广州', 'mode': 'driving', 'places': ['113.1,23.1', '113.2,23.2', '113.3,23.3'], 'start': start})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == '出发地点不正确'
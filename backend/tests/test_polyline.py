@@ -0,0 +1,32 @@
+import random
+
+from transport import polyline
+
+
+def test_encode_decode_round_trip():
+    rng = random.Random(1)
+    coordinates = [[round(113 + rng.random(), 6), round(23 + rng.random(), 6)] for _ in range(200)]
+    decoded = polyline.decode(polyline.encode(coordinates))
+    assert len(decoded) == len(coordinates)
+    for (lng, lat), (dlng, dlat) in zip(coordinates, decoded):
+        assert abs(lng - dlng) < 1e-6 and abs(lat - dlat) < 1e-6
+
+
+def test_round_trip_with_negative_deltas_and_empty_input():
+    coordinates = [[-0.000001, 0.0], [179.999999, -89.999999], [0.0, 0.0]]
+    assert polyline.decode(polyline.encode(coordinates)) == coordinates
+    assert polyline.encode([]) == ''
+    assert polyline.decode('') == []
+
+
+def test_decode_amap_polyline():
+    assert polyline.decode_amap_polyline('113.1,23.2;113.3,23.4') == [[113.1, 23.2], [113.3, 23.4]]
+    assert polyline.decode_amap_polyline('') == []
+
+
+def test_simplify_keeps_endpoints_and_drops_collinear_points():
+    line = [[113.0 + i * 0.001, 23.0] for i in range(10)]
+    assert polyline.simplify(line, 1) == [line[0], line[-1]]
+    bent = line + [[113.009, 23.01]]
+    assert bent[-1] in polyline.simplify(bent, 1)
+    assert polyline.simplify(line, 0) == line
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from common import ratelimit
+from common.ratelimit import BACKGROUND, INTERACTIVE, RateLimited, TokenBucket
+
+
+@pytest.mark.parametrize('processes', [1, 2, 4])
+@pytest.mark.parametrize('name', ['tomorrow', 'moonshot', 'amap'])
+def test_per_process_split_leaves_room_for_background(monkeypatch, name, processes):
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_PROCESSES', processes)
+    settings = ratelimit.quota_config(name)
+    assert settings['rate'] == pytest.approx(ratelimit.QUOTAS[name]['rate'] / processes)
+    assert settings['burst'] >= 1
+
+    bucket = TokenBucket(name, **settings)
+    assert 1 + bucket.floor(BACKGROUND) <= bucket.burst
+    started = time.monotonic()
+    bucket.acquire(BACKGROUND, timeout=0.1)
+    assert time.monotonic() - started < 0.1
+
+
+def test_interactive_uses_reserve_background_does_not():
+    bucket = TokenBucket('test', rate=0.001, burst=4, reserve=0.5)
+    bucket.acquire(BACKGROUND, timeout=0)
+    bucket.acquire(BACKGROUND, timeout=0)
+    # 剩余 2 个令牌为交互请求保留
+    with pytest.raises(RateLimited):
+        bucket.acquire(BACKGROUND, timeout=0)
+    bucket.acquire(INTERACTIVE, timeout=0)
+    bucket.acquire(INTERACTIVE, timeout=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(INTERACTIVE, timeout=0)
+
+
+def test_rejects_immediately_when_no_token_can_arrive():
+    bucket = TokenBucket('test', rate=1, burst=0.5)
+    started = time.monotonic()
+    with pytest.raises(RateLimited):
+        bucket.acquire(BACKGROUND, timeout=5)
+    assert time.monotonic() - started < 0.5
+
+
+def test_rejects_before_deadline_instead_of_waiting():
+    bucket = TokenBucket('test', rate=0.1, burst=1)
+    bucket.acquire(INTERACTIVE, timeout=0)
+    started = time.monotonic()
+    # 下一个令牌要 10 秒后才补充，超过 1 秒的等待上限，立即拒绝
+    with pytest.raises(RateLimited):
+        bucket.acquire(INTERACTIVE, timeout=1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_waits_for_refill_within_deadline():
+    bucket = TokenBucket('test', rate=20, burst=1)
+    bucket.acquire(INTERACTIVE, timeout=0)
+    waited = bucket.acquire(INTERACTIVE, timeout=1)
+    assert 0.02 <= waited < 0.5
+
+
+def test_daily_quota_is_shared_through_sqlite():
+    first = TokenBucket('daily_test', rate=1000, burst=1000, daily_quota=3)
+    for _ in range(2):
+        first.acquire(INTERACTIVE, timeout=0)
+    # 另一个桶（相当于另一个进程）共享同一份当日用量
+    second = TokenBucket('daily_test', rate=1000, burst=1000, daily_quota=3)
+    second.acquire(INTERACTIVE, timeout=0)
+    with pytest.raises(RateLimited):
+        second.acquire(INTERACTIVE, timeout=0)
+    with pytest.raises(RateLimited):
+        first.acquire(INTERACTIVE, timeout=0)
+    assert first.stats()['daily_remaining'] == 0
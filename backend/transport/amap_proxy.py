@@ -1,58 +1,276 @@
 from flask import Blueprint, request, Response
-import os
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
 import requests
 
+from common import circuit, config, http_client, ratelimit
+from common.cache import register_cache
+
 amap_proxy_bp = Blueprint('amap_proxy', __name__)
+logger = logging.getLogger(__name__)
 
 # 获取后端安全密钥
-AMAP_BACKEND_KEY = os.getenv('AMAP_BACKEND_KEY')
+AMAP_BACKEND_KEY = config.get('AMAP_BACKEND_KEY')
 # 获取前端安全密钥（jscode）
-AMAP_JS_SECURITY_KEY = os.getenv('AMAP_JS_SECURITY_KEY', '')
+AMAP_JS_SECURITY_KEY = config.get('AMAP_JS_SECURITY_KEY', '')
+
+# 不转发给上游的请求头：逐跳头会破坏连接复用，Host 由目标地址决定
+SKIPPED_REQUEST_HEADERS = {
+    'host', 'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding',
+    'te', 'trailer', 'upgrade', 'content-length'
+}
+# 不复制给客户端的响应头（响应体已由 requests 解压，长度由 Flask 重新计算）
+SKIPPED_RESPONSE_HEADERS = {
+    'content-length', 'connection', 'content-encoding', 'transfer-encoding', 'keep-alive'
+}
+
+# 允许缓存的静态资源（与用户和 IP 无关）；Web服务API（定位、搜索等）一律不缓存
+CACHEABLE_PREFIXES = ('v4/map/styles', 'v3/vectormap')
+# 上游未给出 Cache-Control / Expires 时的默认缓存时间（秒）
+PROXY_CACHE_DEFAULT_TTL = config.get_int('AMAP_PROXY_CACHE_TTL', 300)
+# 缓存总大小和单个响应的上限（字节）
+PROXY_CACHE_MAX_BYTES = config.get_int('AMAP_PROXY_CACHE_BYTES', 64 * 1024 * 1024)
+PROXY_CACHE_MAX_ENTRY = config.get_int('AMAP_PROXY_CACHE_ENTRY_BYTES', 2 * 1024 * 1024)
+PROXY_CHUNK_SIZE = 64 * 1024
+
+
+class ProxyCache:
+    """按字节数限制大小的 LRU 响应缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        register_cache(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                if entry['expires_at'] > time.time():
+                    self._hits += 1
+                else:
+                    self._stale += 1
+            return entry
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses + self._stale
+            return {
+                'name': 'amap_proxy',
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale': self._stale,
+                'hit_ratio': round(self._hits / total, 4) if total else 0.0
+            }
+
+    def set(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old['body'])
+            self._entries[key] = entry
+            self._bytes += len(entry['body'])
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted['body'])
+
+
+proxy_cache = ProxyCache(PROXY_CACHE_MAX_BYTES)
+
 
 @amap_proxy_bp.route('/_AMapService/<path:path>', methods=['GET', 'POST'])
 def proxy_amap_service(path):
     """
     代理高德地图API请求，自动添加安全密钥
+    上游响应逐块转发；地图样式等静态资源按上游 Cache-Control / ETag 缓存
     """
     # 构建目标URL
     if path.startswith('v4/map/styles'):
         # 自定义地图服务
-        target_url = f'https://webapi.amap.com/v4/map/styles'
+        upstream, target_url = 'amap_webapi', '/v4/map/styles'
     elif path.startswith('v3/vectormap'):
         # 海外地图服务
-        target_url = f'https://fmap01.amap.com/v3/vectormap'
+        upstream, target_url = 'amap_fmap', '/v3/vectormap'
     else:
         # Web服务API
-        target_url = f'https://restapi.amap.com/{path}'
-    
+        upstream, target_url = 'amap', f'/{path}'
+
+    cacheable = request.method == 'GET' and path.startswith(CACHEABLE_PREFIXES)
+
     # 获取请求参数
     args = request.args.copy()
-    
+
     # 添加安全密钥
     args = dict(args)
     args['jscode'] = AMAP_JS_SECURITY_KEY
-    
-    # 添加客户端IP，解决IP定位问题
+
+    # 添加客户端IP，解决IP定位问题（可缓存的静态资源与IP无关，不添加，以便所有用户共享缓存）
     remote_addr = request.remote_addr
-    if remote_addr:
+    if remote_addr and not cacheable:
         args['ip'] = remote_addr
-    
-    # 根据请求方法发送代理请求
-    if request.method == 'GET':
-        resp = requests.get(target_url, params=args, headers=dict(request.headers))
-    else:
-        resp = requests.post(target_url, params=args, data=request.get_data(), headers=dict(request.headers))
-    
+
+    headers = {key: value for key, value in request.headers.items()
+               if key.lower() not in SKIPPED_REQUEST_HEADERS}
+
+    if cacheable:
+        return proxy_cached(upstream, target_url, args, headers)
+
+    # 根据请求方法发送代理请求（前端密钥的请求单独计算限流配额）
+    try:
+        if request.method == 'GET':
+            resp = http_client.get(upstream, target_url, params=args, headers=headers, stream=True,
+                                   quota='amap_js')
+        else:
+            resp = http_client.post(upstream, target_url, params=args, data=request.get_data(),
+                                    headers=headers, stream=True, quota='amap_js')
+    except requests.exceptions.RequestException as e:
+        return upstream_error(e)
+
+    return stream_response(resp)
+
+def upstream_error(e):
+    logger.warning("高德API代理请求失败", extra={'error': str(e)})
+    # 被限流或熔断拒绝时返回 503，便于前端稍后重试
+    status = 503 if isinstance(e, (ratelimit.RateLimited, circuit.CircuitOpen)) else 502
+    return Response('{"status": "0", "info": "UPSTREAM_ERROR"}', status=status, content_type='application/json')
+
+def copy_headers(response, headers):
+    for key, value in headers:
+        if key.lower() not in SKIPPED_RESPONSE_HEADERS:
+            response.headers[key] = value
+
+def stream_response(resp, on_complete=None):
+    """逐块转发上游响应体；on_complete 在完整读取后收到响应体（用于写入缓存）"""
+    def generate():
+        chunks = [] if on_complete else None
+        size = 0
+        try:
+            for chunk in resp.iter_content(chunk_size=PROXY_CHUNK_SIZE):
+                if chunks is not None:
+                    size += len(chunk)
+                    if size <= PROXY_CACHE_MAX_ENTRY:
+                        chunks.append(chunk)
+                    else:
+                        # 超过单条缓存上限，只转发不缓存
+                        chunks = None
+                yield chunk
+            if chunks is not None:
+                on_complete(b''.join(chunks))
+        finally:
+            resp.close()
+
     # 构建响应
     response = Response(
-        resp.content,
+        generate(),
         status=resp.status_code,
         content_type=resp.headers.get('Content-Type', 'application/json')
     )
-    
     # 复制响应头
-    for key, value in resp.headers.items():
-        if key.lower() not in ('content-length', 'connection', 'content-encoding'):
-            response.headers[key] = value
-    
-    return response 
\ No newline at end of file
+    copy_headers(response, resp.headers.items())
+    return response
+
+def proxy_cached(upstream, target_url, args, headers):
+    """带缓存的 GET 代理：新鲜时直接返回，过期时用 ETag / Last-Modified 向上游条件请求"""
+    key = f"{upstream}{target_url}?" + '&'.join(f"{k}={v}" for k, v in sorted(args.items()))
+    entry = proxy_cache.get(key)
+    if entry is not None and entry['expires_at'] > time.time():
+        return cached_response(entry, 'HIT')
+
+    # 条件请求头由代理自己处理，不把客户端的条件头转发给上游
+    headers = {k: v for k, v in headers.items() if k.lower() not in ('if-none-match', 'if-modified-since')}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        resp = http_client.get(upstream, target_url, params=args, headers=headers, stream=True)
+    except requests.exceptions.RequestException as e:
+        return upstream_error(e)
+
+    if resp.status_code == 304 and entry is not None:
+        resp.close()
+        ttl = freshness_lifetime(resp.headers)
+        entry['expires_at'] = time.time() + (ttl or 0)
+        return cached_response(entry, 'REVALIDATED')
+
+    ttl = freshness_lifetime(resp.headers) if is_storable(resp) else None
+
+    def on_complete(body):
+        proxy_cache.set(key, {
+            'status': resp.status_code,
+            'headers': [(k, v) for k, v in resp.headers.items() if k.lower() not in SKIPPED_RESPONSE_HEADERS],
+            'body': body,
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'expires_at': time.time() + ttl
+        })
+
+    # 不可缓存的响应只转发，不写入缓存
+    response = stream_response(resp, on_complete if ttl is not None else None)
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+def cached_response(entry, state):
+    """返回缓存内容；客户端的 If-None-Match 与缓存 ETag 一致时返回 304"""
+    etag = entry['etag']
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=304)
+        response.headers['ETag'] = etag
+    else:
+        content_type = dict((k.lower(), v) for k, v in entry['headers']).get('content-type', 'application/json')
+        response = Response(entry['body'], status=entry['status'], content_type=content_type)
+        copy_headers(response, entry['headers'])
+    response.headers['X-Cache'] = state
+    return response
+
+def is_storable(resp):
+    """仅缓存 200 响应，且上游未禁止缓存、与 Cookie 无关"""
+    if resp.status_code != 200 or 'Set-Cookie' in resp.headers:
+        return False
+    if resp.headers.get('Vary', '').strip() == '*':
+        return False
+    directives = cache_directives(resp.headers)
+    return 'no-store' not in directives and 'private' not in directives
+
+def cache_directives(headers):
+    directives = {}
+    for part in headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+def freshness_lifetime(headers):
+    """
+    根据 Cache-Control / Expires 计算缓存有效期（秒）
+    no-cache 时为 0（每次都需要条件请求），都没有时使用默认值
+    """
+    directives = cache_directives(headers)
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if re.fullmatch(r'\d+', directives.get(name, '')):
+            return int(directives[name])
+    if headers.get('Expires'):
+        try:
+            expires = parsedate_to_datetime(headers['Expires']).timestamp()
+            return max(0, int(expires - time.time()))
+        except (TypeError, ValueError):
+            return 0
+    return PROXY_CACHE_DEFAULT_TTL
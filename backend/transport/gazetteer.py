@@ -0,0 +1,246 @@
+# transport/gazetteer.py
+# 本地地名库：各城市的车站、机场和主要景点坐标，地理编码前先查本地，并用于输入联想。
+#
+# 文件格式（小端）：
+#   b'GZT1' | 条目数 uint32 | 键字节数 uint32 | 名称字节数 uint32
+#   坐标 int32[2 * 条目数]（经度、纬度 × 1e6）| 类型 uint8[条目数]
+#   键（UTF-8，'\n' 分隔，按字典序排列）| 名称（UTF-8，'\n' 分隔，与键一一对应）
+# 键为 "城市\t地点"（均已归一化），按前缀二分查找即可完成精确匹配和联想。
+#
+# 生成（默认包含随代码提供的种子数据 transport/places.tsv 和地理编码缓存，写入 DATA_DIR）：
+#   cd backend
+#   python -m transport.gazetteer [--tsv more.tsv]
+# TSV 每行为：城市<TAB>地点<TAB>经度<TAB>纬度[<TAB>类型]。
+# 启动时 DATA_DIR 下没有地名库文件时按同样的方式自动生成。
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+from common import config, metrics
+from common.cache import normalize_key
+from common.db import data_path, get_connection
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sIII')
+SCALE = 1_000_000
+KINDS = ('poi', 'station', 'airport', 'subway')
+# 随代码提供的种子数据
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'places.tsv')
+
+gazetteer_lookups = metrics.Counter(
+    'gazetteer_lookups_total', '地理编码前查询本地地名库的次数（result 为 hit 或 miss）', ('result',))
+
+
+def normalize_city(city):
+    """城市名归一化，"广州市" 与 "广州" 视为同一城市"""
+    city = normalize_key(city)
+    return city[:-1] if len(city) > 2 and city.endswith('市') else city
+
+
+def make_key(city, place):
+    return f"{normalize_city(city)}\t{normalize_key(place)}"
+
+
+def guess_kind(name):
+    if name.endswith('机场') or '航站楼' in name:
+        return 'airport'
+    if name.endswith('地铁站'):
+        return 'subway'
+    if name.endswith('站'):
+        return 'station'
+    return 'poi'
+
+
+class Gazetteer:
+    def __init__(self, keys=(), names=(), coords=None, kinds=None):
+        self.keys = list(keys)
+        self.names = list(names)
+        self.coords = coords if coords is not None else array('i')
+        self.kinds = kinds if kinds is not None else array('B')
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path):
+        """读取地名库文件；文件不存在时返回空库"""
+        if not os.path.isfile(path):
+            return cls()
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, count, keys_size, names_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"不是地名库文件: {path}")
+        offset = HEADER.size
+        coords = array('i')
+        coords.frombytes(data[offset:offset + 8 * count])
+        offset += 8 * count
+        kinds = array('B', data[offset:offset + count])
+        offset += count
+        keys = data[offset:offset + keys_size].decode('utf-8').split('\n') if count else []
+        offset += keys_size
+        names = data[offset:offset + names_size].decode('utf-8').split('\n') if count else []
+        if len(keys) != count or len(names) != count:
+            raise ValueError(f"地名库文件已损坏: {path}")
+        return cls(keys, names, coords, kinds)
+
+    def save(self, path):
+        keys = '\n'.join(self.keys).encode('utf-8')
+        names = '\n'.join(self.names).encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(self.keys), len(keys), len(names)))
+            f.write(self.coords.tobytes())
+            f.write(self.kinds.tobytes())
+            f.write(keys)
+            f.write(names)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def build(cls, records):
+        """records 为 (城市, 地点, 经度, 纬度, 类型) 的可迭代对象；同一个键保留最后一条"""
+        entries = {}
+        for city, name, lng, lat, kind in records:
+            key = make_key(city, name)
+            if not key.split('\t')[1]:
+                continue
+            # 名称中的换行等空白会破坏文件格式，统一替换为空格
+            entries[key] = (' '.join(name.split()), round(float(lng) * SCALE), round(float(lat) * SCALE),
+                            KINDS.index(kind) if kind in KINDS else KINDS.index(guess_kind(name)))
+        keys = sorted(entries)
+        coords, kinds = array('i'), array('B')
+        for key in keys:
+            _, lng, lat, kind = entries[key]
+            coords.extend((lng, lat))
+            kinds.append(kind)
+        return cls(keys, [entries[key][0] for key in keys], coords, kinds)
+
+    def location(self, index):
+        """高德格式的坐标字符串 "lng,lat" """
+        return f"{self.coords[2 * index] / SCALE:.6f},{self.coords[2 * index + 1] / SCALE:.6f}"
+
+    def lookup(self, city, place):
+        """精确匹配，返回坐标字符串，未收录时返回 None"""
+        if not self.keys:
+            return None
+        key = make_key(city, place)
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            gazetteer_lookups.inc('hit')
+            return self.location(index)
+        gazetteer_lookups.inc('miss')
+        return None
+
+    def complete(self, city, prefix, limit=10):
+        """按前缀联想，返回 [{name, location, kind}, ...]，名称较短（更接近输入）的排在前面"""
+        key_prefix = make_key(city, prefix)
+        index = bisect_left(self.keys, key_prefix)
+        matches = []
+        # 多取一些再按长度排序，避免只返回字典序靠前的长名称
+        while index < len(self.keys) and len(matches) < limit * 5 and self.keys[index].startswith(key_prefix):
+            matches.append(index)
+            index += 1
+        matches.sort(key=lambda i: len(self.keys[i]))
+        return [{'name': self.names[i], 'location': self.location(i), 'kind': KINDS[self.kinds[i]]}
+                for i in matches[:limit]]
+
+
+def default_path():
+    return config.get('GAZETTEER_PATH') or data_path('gazetteer.bin')
+
+
+def load_default():
+    """
+    启动时加载地名库；文件不存在时用种子数据和地理编码缓存生成，
+    文件损坏时记录日志并使用空库，不影响在线地理编码
+    """
+    path = default_path()
+    started = time.perf_counter()
+    try:
+        if not os.path.isfile(path):
+            build_default(path)
+        gazetteer = Gazetteer.load(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("地名库加载失败", extra={'path': path, 'error': str(e)})
+        return Gazetteer()
+    if len(gazetteer):
+        logger.info("地名库已加载", extra={'path': path, 'entries': len(gazetteer),
+                                       'ms': round((time.perf_counter() - started) * 1000, 1)})
+    return gazetteer
+
+
+# ---------- 生成地名库 ----------
+
+def default_records(tsv_paths=(), from_geocode_cache=True, seed=True):
+    """地名库的数据来源：地理编码缓存在前，种子数据和指定的 TSV 在后，同名地点以后者为准"""
+    records = []
+    if from_geocode_cache:
+        records.extend(read_geocode_cache(data_path('cache.sqlite3')))
+    if seed:
+        records.extend(read_tsv(SEED_PATH))
+    for tsv_path in tsv_paths:
+        records.extend(read_tsv(tsv_path))
+    return records
+
+
+def build_default(path):
+    gazetteer = Gazetteer.build(default_records())
+    gazetteer.save(path)
+    logger.info("地名库已生成", extra={'path': path, 'entries': len(gazetteer)})
+    return gazetteer
+
+
+def read_tsv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f, delimiter='\t'):
+            if len(row) < 4 or row[0].startswith('#'):
+                continue
+            yield row[0], row[1], row[2], row[3], row[4] if len(row) > 4 else None
+
+
+def read_geocode_cache(db_path):
+    """从地理编码缓存中导入已查询过的地点（城市名和地点名为归一化后的形式）"""
+    try:
+        rows = get_connection(db_path).execute(
+            "SELECT key, value FROM cache_entries WHERE cache = 'geocode' AND expires_at > ?", (time.time(),)).fetchall()
+    except sqlite3.OperationalError:
+        # 尚未写入过任何缓存（表不存在）
+        return
+    for key, value in rows:
+        city, _, place = key.partition('|')
+        location = json.loads(value)
+        if place and location:
+            lng, lat = location.split(',')
+            yield city, place, lng, lat, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成本地地名库（默认包含种子数据和地理编码缓存）')
+    parser.add_argument('--tsv', action='append', default=[], help='TSV 文件：城市、地点、经度、纬度[、类型]，可重复')
+    parser.add_argument('--no-seed', action='store_true', help='不包含随代码提供的种子数据')
+    parser.add_argument('--no-geocode-cache', action='store_true', help='不导入地理编码缓存中的地点')
+    parser.add_argument('--out', help='输出文件，默认为 GAZETTEER_PATH 或 data/gazetteer.bin')
+    args = parser.parse_args()
+
+    records = default_records(args.tsv, not args.no_geocode_cache, not args.no_seed)
+    if not records:
+        parser.error('没有可导入的地点')
+
+    gazetteer = Gazetteer.build(records)
+    out = args.out or default_path()
+    gazetteer.save(out)
+    print(f"已写入 {len(gazetteer)} 个地点: {out} ({os.path.getsize(out)} 字节)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# transport/itinerary.py
+# 行程排序：根据地点之间的出行时间求游览顺序
+# 地点较少时用 Held-Karp 动态规划求精确解，较多时用最近邻 + 2-opt / Or-opt 局部优化
+
+import math
+
+# 不超过该数量时使用 Held-Karp 精确求解（复杂度 O(2^n * n^2)）
+HELD_KARP_MAX = 12
+# 局部优化的最大轮数
+MAX_IMPROVE_ROUNDS = 50
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_location(location):
+    """把高德格式的 "lng,lat" 转换为 (lng, lat)"""
+    lng, lat = location.split(',')
+    return float(lng), float(lat)
+
+
+def haversine_km(a, b):
+    """两个 (lng, lat) 坐标之间的球面距离（公里）"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def candidate_pairs(distances, neighbors):
+    """每个地点与直线距离最近的 neighbors 个地点组成候选边（无向，i < j）"""
+    n = len(distances)
+    pairs = set()
+    for i in range(n):
+        nearest = sorted((j for j in range(n) if j != i), key=lambda j: distances[i][j])[:neighbors]
+        for j in nearest:
+            pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+
+def path_cost(cost, order, return_to_start=False):
+    total = sum(cost[a][b] for a, b in zip(order, order[1:]))
+    if return_to_start and len(order) > 1:
+        total += cost[order[-1]][order[0]]
+    return total
+
+
+def solve_order(cost, start=0, return_to_start=False):
+    """返回从 start 出发、经过所有地点的顺序（地点下标列表）"""
+    n = len(cost)
+    if n <= 2:
+        return [start] + [i for i in range(n) if i != start]
+    if n <= HELD_KARP_MAX:
+        return held_karp(cost, start, return_to_start)
+    order = nearest_neighbor(cost, start)
+    return improve(cost, order, return_to_start)
+
+
+def held_karp(cost, start, return_to_start=False):
+    """动态规划求精确解：dp[mask][j] 为从 start 出发、经过 mask 中的地点并停在 j 的最小代价"""
+    others = [i for i in range(len(cost)) if i != start]
+    m = len(others)
+    full = (1 << m) - 1
+    dp = [[math.inf] * m for _ in range(full + 1)]
+    parent = [[-1] * m for _ in range(full + 1)]
+    for j in range(m):
+        dp[1 << j][j] = cost[start][others[j]]
+
+    for mask in range(1, full + 1):
+        row = dp[mask]
+        for j in range(m):
+            current = row[j]
+            if current == math.inf or not mask & (1 << j):
+                continue
+            from_node = others[j]
+            for k in range(m):
+                bit = 1 << k
+                if mask & bit:
+                    continue
+                value = current + cost[from_node][others[k]]
+                if value < dp[mask | bit][k]:
+                    dp[mask | bit][k] = value
+                    parent[mask | bit][k] = j
+
+    def final_cost(j):
+        return dp[full][j] + (cost[others[j]][start] if return_to_start else 0)
+
+    last = min(range(m), key=final_cost)
+    order, mask = [], full
+    while last != -1:
+        order.append(others[last])
+        mask, last = mask ^ (1 << last), parent[mask][last]
+    return [start] + order[::-1]
+
+
+def nearest_neighbor(cost, start):
+    order, remaining = [start], set(range(len(cost))) - {start}
+    while remaining:
+        nxt = min(remaining, key=lambda j: cost[order[-1]][j])
+        order.append(nxt)
+        remaining.remove(nxt)
+    return order
+
+
+def improve(cost, order, return_to_start=False):
+    """2-opt（反转区间）和 Or-opt（移动 1~3 个连续地点）局部优化，起点固定不动"""
+    best = path_cost(cost, order, return_to_start)
+    n = len(order)
+    for _ in range(MAX_IMPROVE_ROUNDS):
+        improved = False
+        # 2-opt
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                value = path_cost(cost, candidate, return_to_start)
+                if value < best - 1e-9:
+                    order, best, improved = candidate, value, True
+        # Or-opt
+        for length in (1, 2, 3):
+            for i in range(1, n - length + 1):
+                segment = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                for k in range(1, len(rest) + 1):
+                    if k == i:
+                        continue
+                    candidate = rest[:k] + segment + rest[k:]
+                    value = path_cost(cost, candidate, return_to_start)
+                    if value < best - 1e-9:
+                        order, best, improved = candidate, value, True
+                        break
+        if not improved:
+            break
+    return order
@@ -0,0 +1,112 @@
+# transport/polyline.py
+# 路线坐标处理：高德 polyline 字符串解析、Douglas-Peucker 抽稀、编码为紧凑的 polyline 字符串
+
+import math
+
+# 每度纬度约对应的米数
+METERS_PER_DEGREE = 111320.0
+# 编码精度：高德坐标保留 6 位小数
+POLYLINE_PRECISION = 6
+
+
+def decode_amap_polyline(polyline):
+    """解析高德 polyline（"lng,lat;lng,lat;..."）为 [[lng, lat], ...]"""
+    if not polyline:
+        return []
+    # 一次性拆分并转换为浮点数，避免逐点拆分字符串
+    values = list(map(float, polyline.replace(';', ',').split(',')))
+    return list(map(list, zip(values[0::2], values[1::2])))
+
+
+def tolerance_for_zoom(zoom):
+    """地图缩放级别下约 1 个像素对应的米数（Web 墨卡托，按赤道计算）"""
+    return 156543.03 / (2 ** zoom)
+
+
+def simplify(coordinates, tolerance):
+    """Douglas-Peucker 抽稀，tolerance 单位为米；首尾点始终保留"""
+    n = len(coordinates)
+    if tolerance <= 0 or n < 3:
+        return coordinates
+
+    # 以首点纬度为基准，把经纬度近似投影为平面坐标（米）
+    ky = METERS_PER_DEGREE
+    kx = METERS_PER_DEGREE * math.cos(math.radians(coordinates[0][1]))
+    xs = [point[0] * kx for point in coordinates]
+    ys = [point[1] * ky for point in coordinates]
+
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = xs[first], ys[first]
+        dx, dy = xs[last] - x1, ys[last] - y1
+        segment_sq = dx * dx + dy * dy
+
+        max_sq, index = 0.0, 0
+        for i in range(first + 1, last):
+            px, py = xs[i] - x1, ys[i] - y1
+            if segment_sq:
+                t = (px * dx + py * dy) / segment_sq
+                t = 0.0 if t < 0 else 1.0 if t > 1 else t
+                px, py = px - t * dx, py - t * dy
+            dist_sq = px * px + py * py
+            if dist_sq > max_sq:
+                max_sq, index = dist_sq, i
+
+        if max_sq > tolerance_sq:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(coordinates, keep) if kept]
+
+
+def encode(coordinates, precision=POLYLINE_PRECISION):
+    """
+    按 Google Encoded Polyline 算法编码坐标（保持 [lng, lat] 顺序）
+    前端用 RouteUtils.decodePolyline 解码
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lng = prev_lat = 0
+    for lng, lat in coordinates:
+        lng_i, lat_i = round(lng * factor), round(lat * factor)
+        _encode_value(lng_i - prev_lng, chunks)
+        _encode_value(lat_i - prev_lat, chunks)
+        prev_lng, prev_lat = lng_i, lat_i
+    return ''.join(chunks)
+
+
+def _encode_value(value, chunks):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def decode(text, precision=POLYLINE_PRECISION):
+    """encode 的逆过程，返回 [[lng, lat], ...]"""
+    factor = 10 ** precision
+    coordinates = []
+    index = lng = lat = 0
+    length = len(text)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lng += deltas[0]
+        lat += deltas[1]
+        coordinates.append([lng / factor, lat / factor])
+    return coordinates
@@ -1,19 +1,76 @@
 from flask import Blueprint, jsonify, request
-import os
-import requests
+import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from dotenv import load_dotenv
 
-transport_bp = Blueprint('transport', __name__)
+from common import config, http_client, jobs, metrics, ratelimit, store
+from common.cache import TTLCache, normalize_key
+from common.db import data_path
+from common.sse import sse_event, sse_response, wants_stream
+from . import gazetteer, itinerary, polyline
 
-# 用于存储保存的交通方式
-saved_routes = []
-next_id = 1
+transport_bp = Blueprint('transport', __name__)
+logger = logging.getLogger(__name__)
 
 # 获取高德地图API密钥 
-load_dotenv(dotenv_path='../.env')
-AMAP_KEY = os.getenv('AMAP_BACKEND_KEY')
+AMAP_KEY = config.get('AMAP_BACKEND_KEY')
+
+# 各交通方式并发查询：线程池大小与单个方式的超时预算（秒）
+ROUTE_WORKERS = config.get_int('ROUTE_WORKERS', 16)
+ROUTE_MODE_TIMEOUT = config.get_float('ROUTE_MODE_TIMEOUT', 8)
+route_executor = ThreadPoolExecutor(max_workers=ROUTE_WORKERS, thread_name_prefix='route')
+
+ROUTE_MODE_NAMES = {
+    'driving': '驾车',
+    'transit': '公交',
+    'walking': '步行',
+    'subway': '地铁'
+}
+
+# 地理编码缓存：按 (城市, 地点) 归一化后缓存坐标，持久化到本地 SQLite
+geocode_cache = TTLCache(
+    'geocode',
+    ttl=config.get_int('GEOCODE_CACHE_TTL', 30 * 24 * 3600),
+    maxsize=config.get_int('GEOCODE_CACHE_SIZE', 50000),
+    db_path=data_path('cache.sqlite3')
+)
+
+# 本地地名库：车站、机场和主要景点的坐标，地理编码前先查询，也用于输入联想
+place_index = gazetteer.load_default()
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# 路线结果缓存：按坐标、城市、方式和出发时间分桶缓存，过期后在 ROUTE_CACHE_STALE_TTL 内先返回旧结果并后台刷新
+ROUTE_CACHE_BUCKET_MINUTES = config.get_int('ROUTE_CACHE_BUCKET_MINUTES', 10)
+ROUTE_CACHE_TTL = {
+    'driving': config.get_int('ROUTE_CACHE_TTL_DRIVING', 300),  # 驾车受实时路况影响，过期最快
+    'transit': config.get_int('ROUTE_CACHE_TTL_TRANSIT', 1800),
+    'subway': config.get_int('ROUTE_CACHE_TTL_SUBWAY', 1800),
+    'walking': config.get_int('ROUTE_CACHE_TTL_WALKING', 86400)
+}
+route_cache = TTLCache(
+    'route',
+    ttl=ROUTE_CACHE_TTL['driving'],
+    maxsize=config.get_int('ROUTE_CACHE_SIZE', 5000),
+    stale_ttl=config.get_int('ROUTE_CACHE_STALE_TTL', 600)
+)
+# 出行时间矩阵：地点数量上限和单个请求同时查询的路线数
+MATRIX_MAX_PLACES = config.get_int('MATRIX_MAX_PLACES', 25)
+MATRIX_CONCURRENCY = config.get_int('MATRIX_CONCURRENCY', 8)
+# 行程排序：地点数量上限、每个地点查询真实路线的近邻数（按直线距离）、补查路线后重新求解的轮数
+ITINERARY_MAX_PLACES = config.get_int('ITINERARY_MAX_PLACES', 30)
+ITINERARY_NEIGHBORS = config.get_int('ITINERARY_NEIGHBORS', 3)
+ITINERARY_REFINE_ROUNDS = config.get_int('ITINERARY_REFINE_ROUNDS', 3)
+# 还没有真实路线可参考时，按直线距离估算出行时间使用的速度（公里/小时，已计入绕行）
+ITINERARY_FALLBACK_SPEED = {'driving': 25, 'transit': 15, 'subway': 20, 'walking': 4}
+
+# 地理编码使用对冲请求降低长尾延迟（设为 0 关闭）
+GEOCODE_HEDGE = config.get_bool('GEOCODE_HEDGE', True)
+
+# 正在后台刷新的缓存键，避免重复刷新
+refreshing_routes = set()
+refreshing_lock = threading.Lock()
 
 @transport_bp.route('/api/transport/search', methods=['POST'])
 def search_transport():
@@ -37,27 +94,460 @@ def search_transport():
         except:
             return jsonify({'error': '时间格式不正确，请使用HH:MM格式'}), 400
     
-    # 调用高德地图API获取路线
-    routes = {
-        'driving': get_driving_route(city, origin, destination),
-        'transit': get_transit_route(city, origin, destination, departure_time),
-        'walking': get_walking_route(city, origin, destination),
-        'subway': get_subway_route(city, origin, destination, departure_time)
-    }
+    # 路径输出选项：simplify 为抽稀容差（米），zoom 为目标地图缩放级别，pathFormat 为 coordinates 或 polyline
+    try:
+        tolerance = path_tolerance(data.get('simplify'), data.get('zoom'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '路径抽稀参数不正确'}), 400
+    path_format = data.get('pathFormat', 'coordinates')
+    if path_format not in ('coordinates', 'polyline'):
+        return jsonify({'error': '路径格式不正确，请使用coordinates或polyline'}), 400
+    
+    # 起点和终点只做一次地理编码，结果传给各方式
+    origin_loc, destination_loc = resolve_locations(city, origin, destination)
+    if not origin_loc or not destination_loc:
+        return jsonify({mode: route_error(mode) for mode in ROUTE_MODE_NAMES})
+    
+    routes, cache_status = search_routes(city, origin_loc, destination_loc, departure_time)
+    if tolerance or path_format != 'coordinates':
+        routes = {mode: format_route(route, tolerance, path_format) for mode, route in routes.items()}
+    
+    response = jsonify(routes)
+    # 每种方式的缓存状态：hit / miss / stale
+    response.headers['X-Route-Cache'] = ', '.join(f'{mode}={state}' for mode, state in cache_status.items())
+    return response
+
+def path_tolerance(simplify=None, zoom=None):
+    """根据请求参数计算抽稀容差（米），simplify 优先，都未提供时不抽稀"""
+    if simplify not in (None, ''):
+        tolerance = float(simplify)
+    elif zoom not in (None, ''):
+        zoom = float(zoom)
+        if not 3 <= zoom <= 20:
+            raise ValueError('zoom out of range')
+        tolerance = polyline.tolerance_for_zoom(zoom)
+    else:
+        return 0
+    if not 0 <= tolerance <= 10000:
+        raise ValueError('tolerance out of range')
+    return tolerance
+
+def format_route(route, tolerance=0, path_format='coordinates'):
+    """按请求对路径抽稀或编码；返回新对象，不修改缓存中的结果"""
+    if route.get('status') != 'success':
+        return route
+    path = []
+    for step in route.get('path', []):
+        step = dict(step)
+        coordinates = polyline.simplify(step.pop('coordinates', []), tolerance)
+        if path_format == 'polyline':
+            step['polyline'] = polyline.encode(coordinates)
+        else:
+            step['coordinates'] = coordinates
+        path.append(step)
+    return {**route, 'path': path}
+
+def route_tasks(city, origin, destination, departure_time=None):
+    """各方式的查询任务（公交和地铁共用一次查询）"""
+    return [
+        (('driving',), get_driving_route, (origin, destination)),
+        (('transit', 'subway'), get_transit_routes, (city, origin, destination, departure_time)),
+        (('walking',), get_walking_route, (origin, destination))
+    ]
+
+def search_routes(city, origin, destination, departure_time=None):
+    """
+    查询各方式路线，优先使用路线缓存，未命中的方式并发查询高德
+    返回 (routes, cache_status)
+    """
+    routes, cache_status, pending = {}, {}, []
+    for modes, func, args in route_tasks(city, origin, destination, departure_time):
+        key = route_cache_key(modes, city, origin, destination, departure_time)
+        cached, state = route_cache.lookup(key)
+        if state == 'miss':
+            pending.append((modes, func, args))
+        else:
+            routes.update(cached)
+            if state == 'stale':
+                refresh_route_in_background(key, modes, func, args)
+        for mode in modes:
+            cache_status[mode] = state
+    
+    if pending:
+        fetched = fetch_routes_concurrently(pending)
+        routes.update(fetched)
+        for modes, func, args in pending:
+            store_routes(route_cache_key(modes, city, origin, destination, departure_time), modes, fetched)
+    
+    return {mode: routes[mode] for mode in ROUTE_MODE_NAMES}, cache_status
+
+def departure_bucket(departure_time=None):
+    """把出发时间（默认当前时间）按 ROUTE_CACHE_BUCKET_MINUTES 分桶"""
+    now = datetime.now()
+    if departure_time:
+        hour, minute = map(int, departure_time.split(':'))
+    else:
+        hour, minute = now.hour, now.minute
+    return f"{now.strftime('%Y%m%d')}-{(hour * 60 + minute) // ROUTE_CACHE_BUCKET_MINUTES}"
+
+def route_cache_key(modes, city, origin, destination, departure_time=None):
+    if modes == ('walking',):
+        # 步行路线与出发时间无关
+        bucket = '-'
+    elif modes == ('driving',):
+        # 驾车始终按实时路况规划，只与当前时间有关
+        bucket = departure_bucket()
+    else:
+        bucket = departure_bucket(departure_time)
+    return f"{'+'.join(modes)}|{normalize_key(city)}|{origin}|{destination}|{bucket}"
+
+def store_routes(key, modes, routes):
+    """至少有一种方式查询成功时写入缓存，TTL 取这些方式中最短的"""
+    results = {mode: routes.get(mode) or route_error(mode) for mode in modes}
+    if any(result.get('status') == 'success' for result in results.values()):
+        route_cache.set(key, results, ttl=min(ROUTE_CACHE_TTL[mode] for mode in modes))
+
+def refresh_route_in_background(key, modes, func, args):
+    """后台刷新过期的缓存条目，同一条目同时只刷新一次"""
+    with refreshing_lock:
+        if key in refreshing_routes:
+            return
+        refreshing_routes.add(key)
+    
+    def refresh():
+        # 已在线程池中运行，直接调用查询函数，避免占用两个工作线程
+        try:
+            result = func(*args)
+            store_routes(key, modes, {modes[0]: result} if len(modes) == 1 else result)
+        except Exception as e:
+            logger.warning("路线缓存后台刷新错误", extra={'modes': list(modes), 'error': str(e)})
+        finally:
+            with refreshing_lock:
+                refreshing_routes.discard(key)
+    
+    # 后台刷新按低优先级限流，不与用户请求争抢配额
+    route_executor.submit(ratelimit.background(refresh))
+
+def route_error(mode):
+    """某一交通方式查询失败时的统一返回"""
+    return {'status': 'error', 'message': f'无法获取{ROUTE_MODE_NAMES.get(mode, mode)}路线'}
+
+def resolve_locations(city, *places):
+    """并发解析多个地点的坐标，超时或失败的地点返回空字符串"""
+    futures = [route_executor.submit(get_location, city, place) for place in places]
+    wait(futures, timeout=ROUTE_MODE_TIMEOUT)
+    locations = []
+    for future in futures:
+        try:
+            locations.append(future.result(timeout=0) if future.done() else '')
+        except Exception as e:
+            logger.warning("地理编码错误", extra={'error': str(e)})
+            locations.append('')
+    return locations
+
+def fetch_routes_concurrently(tasks, timeout=None):
+    """
+    并发执行各交通方式的查询，超时或失败的方式单独返回错误，不影响其他方式
+    tasks 为 (modes, func, args) 列表：只有一个方式时 func 返回该方式的结果，
+    多个方式共用一次查询时 func 返回以方式为键的字典
+    """
+    budget = ROUTE_MODE_TIMEOUT if timeout is None else timeout
+    futures = [(modes, route_executor.submit(func, *args)) for modes, func, args in tasks]
+    # 所有方式同时开始，因此共享同一个超时预算
+    wait([future for _, future in futures], timeout=budget)
+    
+    routes = {}
+    for modes, future in futures:
+        if not future.done():
+            future.cancel()
+            for mode in modes:
+                routes[mode] = {'status': 'timeout', 'message': f'{ROUTE_MODE_NAMES.get(mode, mode)}路线查询超时'}
+            continue
+        try:
+            result = future.result()
+            if len(modes) == 1:
+                result = {modes[0]: result}
+            for mode in modes:
+                routes[mode] = result.get(mode) or route_error(mode)
+        except Exception as e:
+            logger.warning("路线查询错误", extra={'modes': list(modes), 'error': str(e)})
+            for mode in modes:
+                routes[mode] = route_error(mode)
+    return routes
+
+@transport_bp.route('/api/transport/geocode_cache', methods=['GET'])
+def geocode_cache_stats():
+    """地理编码缓存的命中/未命中统计"""
+    return jsonify(geocode_cache.stats())
+
+@transport_bp.route('/api/transport/autocomplete', methods=['GET'])
+def autocomplete():
+    """地点输入联想：?city=&q=&limit=，只查询本地地名库，按前缀匹配"""
+    city = request.args.get('city', '')
+    prefix = request.args.get('q', '')
+    if not city or not prefix.strip():
+        return jsonify({'error': '城市和关键词不能为空'}), 400
+    try:
+        limit = int(request.args.get('limit', '10'))
+    except ValueError:
+        return jsonify({'error': 'limit 参数不正确'}), 400
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    return jsonify(place_index.complete(city, prefix, limit))
+
+@transport_bp.route('/api/transport/route_cache', methods=['GET'])
+def route_cache_stats():
+    """路线结果缓存的命中/未命中/过期统计"""
+    return jsonify(route_cache.stats())
+
+@transport_bp.route('/api/transport/matrix', methods=['POST'])
+def travel_matrix():
+    """
+    计算多个地点两两之间的出行时间（分钟）和距离（公里）矩阵
+    places 为空时使用收藏的景点；stream 为 true 时每算完一行就以 SSE 返回
+    """
+    data = request.get_json()
+    city = data.get('city', '')
+    mode = data.get('mode', 'driving')
+    departure_time = data.get('departureTime', '')
+    places = data.get('places') or [spot['name'] for spot in store.list_spots()[0]]
+    
+    if not city:
+        return jsonify({'error': '城市不能为空'}), 400
+    if mode not in ROUTE_MODE_NAMES:
+        return jsonify({'error': '交通方式不正确'}), 400
+    if not isinstance(places, list) or not 2 <= len(places) <= MATRIX_MAX_PLACES:
+        return jsonify({'error': f'地点数量需要在2到{MATRIX_MAX_PLACES}个之间'}), 400
+    if departure_time:
+        try:
+            hour, minute = map(int, departure_time.split(':'))
+            if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                raise ValueError(departure_time)
+        except ValueError:
+            return jsonify({'error': '时间格式不正确，请使用HH:MM格式'}), 400
+    
+    places = [str(place) for place in places]
+    # 每个地点只做一次地理编码
+    locations = resolve_locations(city, *places)
+    header = {'mode': mode, 'places': places, 'locations': locations}
+    rows = iter_matrix_rows(city, mode, locations, departure_time)
+    
+    if wants_stream(data):
+        def events():
+            yield sse_event(header, event='places')
+            try:
+                for row in rows:
+                    yield sse_event(row, event='row')
+                yield sse_event({'done': True}, event='done')
+            finally:
+                rows.close()
+        return sse_response(events())
+    
+    n = len(places)
+    matrix = {**header, 'durations': [None] * n, 'distances': [None] * n}
+    for row in rows:
+        matrix['durations'][row['row']] = row['durations']
+        matrix['distances'][row['row']] = row['distances']
+    return jsonify(matrix)
+
+def iter_matrix_rows(city, mode, locations, departure_time=None):
+    """
+    并发查询所有地点对（最多 MATRIX_CONCURRENCY 个同时进行），某一行全部完成后立即产出该行
+    地理编码失败或查询失败的位置为 None
+    """
+    n = len(locations)
+    durations = [[0 if i == j else None for j in range(n)] for i in range(n)]
+    distances = [[0 if i == j else None for j in range(n)] for i in range(n)]
+    pending = [0] * n
+    pool = ThreadPoolExecutor(max_workers=MATRIX_CONCURRENCY, thread_name_prefix='matrix')
+    try:
+        futures = {}
+        for i in range(n):
+            for j in range(n):
+                if i != j and locations[i] and locations[j]:
+                    future = pool.submit(fetch_mode_route, mode, city, locations[i], locations[j], departure_time)
+                    futures[future] = (i, j)
+                    pending[i] += 1
+        
+        # 没有待查询地点对的行（如地理编码失败）直接返回
+        for i in range(n):
+            if not pending[i]:
+                yield {'row': i, 'durations': durations[i], 'distances': distances[i]}
+        
+        for future in as_completed(futures):
+            i, j = futures[future]
+            try:
+                route = future.result()
+            except Exception as e:
+                logger.warning("出行时间矩阵查询错误", extra={'mode': mode, 'error': str(e)})
+                route = route_error(mode)
+            if route.get('status') == 'success':
+                durations[i][j] = route['duration']
+                distances[i][j] = route['distance']
+            pending[i] -= 1
+            if not pending[i]:
+                yield {'row': i, 'durations': durations[i], 'distances': distances[i]}
+    finally:
+        # 客户端断开时取消尚未开始的查询
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def fetch_mode_route(mode, city, origin, destination, departure_time=None):
+    """查询单一方式的路线，与 /api/transport/search 共用路线缓存"""
+    modes, func, args = next(task for task in route_tasks(city, origin, destination, departure_time)
+                             if mode in task[0])
+    key = route_cache_key(modes, city, origin, destination, departure_time)
+    cached, state = route_cache.lookup(key)
+    if state != 'miss':
+        if state == 'stale':
+            refresh_route_in_background(key, modes, func, args)
+        return cached[mode]
+    
+    result = func(*args)
+    results = {modes[0]: result} if len(modes) == 1 else result
+    store_routes(key, modes, results)
+    return results.get(mode) or route_error(mode)
+
+@transport_bp.route('/api/transport/itinerary', methods=['POST'])
+def plan_itinerary():
+    """
+    为多个地点（默认使用收藏的景点）安排游览顺序，使总出行时间最短
+    start 为出发地点的下标，roundTrip 为 true 时最后回到出发地点
+    """
+    data = request.get_json()
+    city = data.get('city', '')
+    mode = data.get('mode', 'driving')
+    departure_time = data.get('departureTime', '')
+    places = data.get('places') or [spot['name'] for spot in store.list_spots()[0]]
+    start = data.get('start', 0)
+    round_trip = bool(data.get('roundTrip', False))
+    
+    if not city:
+        return jsonify({'error': '城市不能为空'}), 400
+    if mode not in ROUTE_MODE_NAMES:
+        return jsonify({'error': '交通方式不正确'}), 400
+    if not isinstance(places, list) or not 2 <= len(places) <= ITINERARY_MAX_PLACES:
+        return jsonify({'error': f'地点数量需要在2到{ITINERARY_MAX_PLACES}个之间'}), 400
+    # bool 是 int 的子类，JSON 中的 true/false 不能当作下标
+    if isinstance(start, bool) or not isinstance(start, int) or not 0 <= start < len(places):
+        return jsonify({'error': '出发地点不正确'}), 400
+    if departure_time:
+        try:
+            hour, minute = map(int, departure_time.split(':'))
+            if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                raise ValueError(departure_time)
+        except ValueError:
+            return jsonify({'error': '时间格式不正确，请使用HH:MM格式'}), 400
+    
+    places = [str(place) for place in places]
+    locations = resolve_locations(city, *places)
+    if not locations[start]:
+        return jsonify({'error': '无法获取出发地点的坐标'}), 400
+    # 地理编码失败的地点不参与排序，单独返回
+    resolved = [i for i, location in enumerate(locations) if location]
+    if len(resolved) < 2:
+        return jsonify({'error': '可以定位的地点不足2个'}), 400
+    
+    plan = order_itinerary(city, mode, [locations[i] for i in resolved], resolved.index(start),
+                           round_trip, departure_time)
+    stops = [{'name': places[resolved[i]], 'location': locations[resolved[i]]} for i in plan['order']]
+    legs = [{**leg, 'from': places[resolved[leg['from']]], 'to': places[resolved[leg['to']]]}
+            for leg in plan['legs']]
+    return jsonify({
+        'mode': mode,
+        'roundTrip': round_trip,
+        'order': stops,
+        'legs': legs,
+        'totalDuration': sum(leg['duration'] for leg in legs),
+        'unresolved': [place for place, location in zip(places, locations) if not location],
+        # 实际查询的路线数与完整矩阵所需查询数
+        'routeQueries': plan['queries'],
+        'matrixQueries': len(resolved) * (len(resolved) - 1)
+    })
+
+def order_itinerary(city, mode, locations, start=0, round_trip=False, departure_time=None):
+    """
+    求游览顺序：先按直线距离为每个地点选出最近的几个地点查询真实路线，
+    其余地点对按真实路线的"时间/直线距离"比例估算；求解后补查顺序中仍是估算的路段并重新求解
+    """
+    coords = [itinerary.parse_location(location) for location in locations]
+    straight = [[itinerary.haversine_km(a, b) for b in coords] for a in coords]
+    routes = {}  # (i, j) -> 路线结果，查询失败为 None
     
-    return jsonify(routes)
+    def fetch(pairs):
+        pairs = [pair for pair in pairs if pair not in routes]
+        if not pairs:
+            return
+        with ThreadPoolExecutor(max_workers=MATRIX_CONCURRENCY, thread_name_prefix='itinerary') as pool:
+            futures = {pool.submit(fetch_mode_route, mode, city, locations[i], locations[j], departure_time): (i, j)
+                       for i, j in pairs}
+            for future in as_completed(futures):
+                try:
+                    route = future.result()
+                except Exception as e:
+                    logger.warning("行程路线查询错误", extra={'mode': mode, 'error': str(e)})
+                    route = None
+                routes[futures[future]] = route if route and route.get('status') == 'success' else None
+    
+    def leg_pairs(order):
+        pairs = list(zip(order, order[1:]))
+        if round_trip:
+            pairs.append((order[-1], order[0]))
+        return pairs
+    
+    # 候选边只查一个方向，估算时两个方向共用
+    fetch(sorted(itinerary.candidate_pairs(straight, ITINERARY_NEIGHBORS)))
+    for _ in range(ITINERARY_REFINE_ROUNDS):
+        cost = itinerary_costs(mode, straight, routes)
+        order = itinerary.solve_order(cost, start, round_trip)
+        missing = [pair for pair in leg_pairs(order) if pair not in routes]
+        if not missing:
+            break
+        fetch(missing)
+    
+    legs = []
+    for i, j in leg_pairs(order):
+        route = routes.get((i, j))
+        if route:
+            legs.append({'from': i, 'to': j, 'duration': route['duration'],
+                         'distance': route['distance'], 'estimated': False})
+        else:
+            legs.append({'from': i, 'to': j, 'duration': round(cost[i][j]),
+                         'distance': None, 'estimated': True})
+    return {'order': order, 'legs': legs, 'queries': len(routes)}
+
+def itinerary_costs(mode, straight, routes):
+    """出行时间矩阵（分钟）：有真实路线的用真实时间（反方向也可参考），其余按直线距离估算"""
+    ratios = sorted(route['duration'] / straight[i][j] for (i, j), route in routes.items()
+                    if route and straight[i][j] > 0.1)
+    # 取中位数，避免个别绕行很远的路线影响估算
+    minutes_per_km = ratios[len(ratios) // 2] if ratios else 60 / ITINERARY_FALLBACK_SPEED[mode]
+    
+    n = len(straight)
+    cost = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            if i == j:
+                continue
+            route = routes.get((i, j)) or routes.get((j, i))
+            cost[i][j] = route['duration'] if route else straight[i][j] * minutes_per_km
+    return cost
 
 @transport_bp.route('/api/saved_routes', methods=['GET'])
 def get_saved_routes():
-    return jsonify(saved_routes)
+    # 可选分页：?limit=&offset=，总数通过 X-Total-Count 返回
+    try:
+        limit, offset = store.parse_pagination(request.args)
+    except ValueError:
+        return jsonify({'error': '分页参数不正确'}), 400
+    routes, total = store.list_routes(limit, offset)
+    response = jsonify(routes)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 @transport_bp.route('/api/saved_routes', methods=['POST'])
 def save_route():
-    global next_id
     data = request.get_json()
     
     route_data = {
-        'id': next_id,
         'city': data.get('city', ''),
         'origin': data.get('origin', ''),
         'destination': data.get('destination', ''),
@@ -68,31 +558,60 @@ def save_route():
         'saved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    saved_routes.append(route_data)
-    next_id += 1
+    route_data = store.add_route(route_data)
+    # 后台预取坐标、城市天气和景点推荐，之后查看时直接命中缓存
+    prefetch_route(route_data)
     
     return jsonify({'success': True, 'route': route_data})
 
+def prefetch_route(route):
+    """收藏路线后提交预取任务（各模块在此处才导入，避免模块之间循环导入）"""
+    from attractions.attraction import is_valid_location, prefetch_suggestion
+    from weather.app.weather_api import normalize_location, prefetch_timeline
+
+    city, origin, destination = route['city'], route['origin'], route['destination']
+    for place in (origin, destination):
+        if place:
+            jobs.submit('geocode', 'geocode|' + geocode_cache_key(city, place), prefetch_location, city, place)
+    # 天气页按城市查询，键与天气接口的缓存键（normalize_location）一致
+    if city:
+        jobs.submit('weather', 'weather|' + normalize_location(city), prefetch_timeline, city)
+    if is_valid_location(city):
+        jobs.submit('ai_suggestion', 'ai_suggestion|' + normalize_key(city), prefetch_suggestion, city)
+
 @transport_bp.route('/api/saved_routes/<int:route_id>', methods=['DELETE'])
 def delete_saved_route(route_id):
-    global saved_routes
-    saved_routes = [route for route in saved_routes if route['id'] != route_id]
+    store.delete_route(route_id)
     return jsonify({'success': True})
 
-def get_driving_route(city, origin, destination):
-    """获取驾车路线"""
-    url = "https://restapi.amap.com/v3/direction/driving"
+def amap_request(url, params, hedge=False):
+    """
+    调用高德 Web 服务 API 并返回 JSON；业务错误（status 不为 '1'）按 infocode 记录
+    hedge 为 true 时使用对冲请求（只用于地理编码等开销小的查询）
+    """
+    if hedge and GEOCODE_HEDGE:
+        response = http_client.hedged_get('amap', url, params=params)
+    else:
+        response = http_client.get('amap', url, params=params)
+    data = response.json()
+    if data.get('status') != '1':
+        metrics.upstream_errors.inc('amap', data.get('infocode', 'unknown'))
+        logger.warning("高德API返回错误", extra={'path': url, 'infocode': data.get('infocode'), 'info': data.get('info')})
+    return data
+
+def get_driving_route(origin, destination):
+    """获取驾车路线（origin/destination 为已解析的经纬度坐标）"""
+    url = "/v3/direction/driving"
     params = {
         'key': AMAP_KEY,
-        'origin': get_location(city, origin),
-        'destination': get_location(city, destination),
+        'origin': origin,
+        'destination': destination,
         'extensions': 'base',
         'strategy': 10  # 默认策略
     }
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = amap_request(url, params)
         
         if data.get('status') == '1' and data.get('count', '0') != '0':
             route = data['route']['paths'][0]
@@ -103,13 +622,16 @@ def get_driving_route(city, origin, destination):
                 'path': parse_path(route['steps'])
             }
     except Exception as e:
-        print(f"驾车路线查询错误: {e}")
+        logger.warning("驾车路线查询错误", extra={'error': str(e)})
     
     return {'status': 'error', 'message': '无法获取驾车路线'}
 
-def get_transit_route(city, origin, destination, departure_time=None):
-    """获取公交路线"""
-    url = "https://restapi.amap.com/v3/direction/transit/integrated"
+def get_transit_routes(city, origin, destination, departure_time=None):
+    """
+    获取公交和地铁路线（origin/destination 为已解析的经纬度坐标）
+    两者共用同一次 transit/integrated 查询：公交取第一条方案，地铁取第一条包含地铁线路的方案
+    """
+    url = "/v3/direction/transit/integrated"
     
     # 处理出发时间
     time_params = {}
@@ -121,42 +643,60 @@ def get_transit_route(city, origin, destination, departure_time=None):
     
     params = {
         'key': AMAP_KEY,
-        'origin': get_location(city, origin),
-        'destination': get_location(city, destination),
+        'origin': origin,
+        'destination': destination,
         'city': city,
+        'nightflag': '0',  # 不考虑夜班车（与高德默认值一致）
         'extensions': 'base',
         **time_params
     }
     
+    routes = {'transit': route_error('transit'), 'subway': route_error('subway')}
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = amap_request(url, params)
         
         if data.get('status') == '1' and data.get('count', '0') != '0':
-            route = data['route']['transits'][0]
-            return {
-                'status': 'success',
-                'duration': int(route['duration']) // 60,  # 转换为分钟
-                'distance': float(route['distance']) / 1000,  # 转换为公里
-                'path': parse_transit_path(route['segments'])
-            }
+            transits = data['route']['transits']
+            if transits:
+                routes['transit'] = build_transit_result(transits[0])
+            
+            # 尝试查找包含地铁的路线
+            for transit in transits:
+                if is_subway_transit(transit):
+                    routes['subway'] = build_transit_result(transit)
+                    break
     except Exception as e:
-        print(f"公交路线查询错误: {e}")
+        logger.warning("公交路线查询错误", extra={'error': str(e)})
+    
+    return routes
+
+def is_subway_transit(transit):
+    """检查公交方案中是否包含地铁线路"""
+    for segment in transit.get('segments', []):
+        for bus in segment.get('bus', {}).get('buslines', []):
+            if '地铁' in bus.get('name', ''):
+                return True
+    return False
 
-    return {'status': 'error', 'message': '无法获取公交路线'}
+def build_transit_result(transit):
+    return {
+        'status': 'success',
+        'duration': int(transit['duration']) // 60,  # 转换为分钟
+        'distance': float(transit['distance']) / 1000,  # 转换为公里
+        'path': parse_transit_path(transit['segments'])
+    }
 
-def get_walking_route(city, origin, destination):
-    """获取步行路线"""
-    url = "https://restapi.amap.com/v3/direction/walking"
+def get_walking_route(origin, destination):
+    """获取步行路线（origin/destination 为已解析的经纬度坐标）"""
+    url = "/v3/direction/walking"
     params = {
         'key': AMAP_KEY,
-        'origin': get_location(city, origin),
-        'destination': get_location(city, destination)
+        'origin': origin,
+        'destination': destination
     }
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = amap_request(url, params)
         
         if data.get('status') == '1' and data.get('count', '0') != '0':
             route = data['route']['paths'][0]
@@ -167,63 +707,15 @@ def get_walking_route(city, origin, destination):
                 'path': parse_path(route['steps'])
             }
     except Exception as e:
-        print(f"步行路线查询错误: {e}")
+        logger.warning("步行路线查询错误", extra={'error': str(e)})
     
     return {'status': 'error', 'message': '无法获取步行路线'}
 
-def get_subway_route(city, origin, destination, departure_time=None):
-    """获取地铁路线 (实际上使用transit API，但过滤仅地铁)"""
-    url = "https://restapi.amap.com/v3/direction/transit/integrated"
-    
-    # 处理出发时间
-    time_params = {}
-    if departure_time:
-        current_date = datetime.now().strftime('%Y%m%d')
-        time_params = {
-            'departure_time': f"{current_date} {departure_time}"
-        }
-    
-    params = {
-        'key': AMAP_KEY,
-        'origin': get_location(city, origin),
-        'destination': get_location(city, destination),
-        'city': city,
-        'nightflag': '0',  # 不考虑夜班车
-        'extensions': 'base',
-        **time_params
-    }
-    
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data.get('status') == '1' and data.get('count', '0') != '0':
-            # 尝试查找包含地铁的路线
-            for transit in data['route']['transits']:
-                # 检查是否是地铁路线
-                is_subway_route = False
-                for segment in transit.get('segments', []):
-                    for bus in segment.get('bus', {}).get('buslines', []):
-                        if '地铁' in bus.get('name', ''):
-                            is_subway_route = True
-                            break
-                    if is_subway_route:
-                        break
-                
-                if is_subway_route:
-                    return {
-                        'status': 'success',
-                        'duration': int(transit['duration']) // 60,  # 转换为分钟
-                        'distance': float(transit['distance']) / 1000,  # 转换为公里
-                        'path': parse_transit_path(transit['segments'])
-                    }
-    except Exception as e:
-        print(f"地铁路线查询错误: {e}")
-    
-    return {'status': 'error', 'message': '无法获取地铁路线'}
+def geocode_cache_key(city, place):
+    return f"{normalize_key(city)}|{normalize_key(place)}"
 
 def get_location(city, place):
-    """获取地点的经纬度坐标"""
+    """获取地点的经纬度坐标（依次查询本地地名库、地理编码缓存和高德地理编码）"""
     # 如果place已经是经纬度坐标，则直接返回
     if ',' in place and len(place.split(',')) == 2:
         try:
@@ -233,8 +725,32 @@ def get_location(city, place):
         except:
             pass
     
+    # 本地地名库收录的地点不需要请求高德
+    location = place_index.lookup(city, place)
+    if location:
+        return location
+    
+    cache_key = geocode_cache_key(city, place)
+    location = geocode_cache.get(cache_key)
+    if location:
+        return location
+    
+    location = geocode_location(city, place)
+    if location:
+        geocode_cache.set(cache_key, location)
+    return location
+
+def prefetch_location(city, place):
+    """后台任务：预取地点坐标（写入地理编码缓存），失败时抛出异常，在任务状态中可见"""
+    location = get_location(city, place)
+    if not location:
+        raise RuntimeError('地理编码失败')
+    return location
+
+def geocode_location(city, place):
+    """调用高德地理编码API获取坐标"""
     # 使用地理编码API获取坐标
-    url = "https://restapi.amap.com/v3/geocode/geo"
+    url = "/v3/geocode/geo"
     params = {
         'key': AMAP_KEY,
         'address': place,
@@ -242,13 +758,12 @@ def get_location(city, place):
     }
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = amap_request(url, params, hedge=True)
         
         if data.get('status') == '1' and data.get('count', '0') != '0':
             return data['geocodes'][0]['location']
     except Exception as e:
-        print(f"地理编码错误: {e}")
+        logger.warning("地理编码错误", extra={'city': city, 'place': place, 'error': str(e)})
     
     # 如果无法获取坐标，返回空字符串
     return ''
@@ -257,13 +772,7 @@ def parse_path(steps):
     """解析驾车和步行路径"""
     path = []
     for step in steps:
-        coordinates = []
-        polyline = step.get('polyline', '')
-        if polyline:
-            points = polyline.split(';')
-            for point in points:
-                lng, lat = point.split(',')
-                coordinates.append([float(lng), float(lat)])
+        coordinates = polyline.decode_amap_polyline(step.get('polyline', ''))
         
         instruction = step.get('instruction', '').replace('<b>', '').replace('</b>', '')
         
@@ -284,13 +793,7 @@ def parse_transit_path(segments):
             walk = segment['walking']
             steps = walk.get('steps', [])
             for step in steps:
-                polyline = step.get('polyline', '')
-                coordinates = []
-                if polyline:
-                    points = polyline.split(';')
-                    for point in points:
-                        lng, lat = point.split(',')
-                        coordinates.append([float(lng), float(lat)])
+                coordinates = polyline.decode_amap_polyline(step.get('polyline', ''))
                 
                 instruction = step.get('instruction', '').replace('<b>', '').replace('</b>', '')
                 
@@ -303,13 +806,7 @@ def parse_transit_path(segments):
         # 公交部分
         if 'bus' in segment and segment['bus'].get('buslines'):
             for bus in segment['bus'].get('buslines', []):
-                polyline = bus.get('polyline', '')
-                coordinates = []
-                if polyline:
-                    points = polyline.split(';')
-                    for point in points:
-                        lng, lat = point.split(',')
-                        coordinates.append([float(lng), float(lat)])
+                coordinates = polyline.decode_amap_polyline(bus.get('polyline', ''))
                 
                 name = bus.get('name', '')
                 instruction = f"乘坐{name}，从{bus.get('departure_stop', {}).get('name', '')}到{bus.get('arrival_stop', {}).get('name', '')}"
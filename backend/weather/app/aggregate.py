@@ -0,0 +1,78 @@
+# aggregate.py
+# 天气数据的列式格式和按时间段汇总：每个字段一个数组，时间轴为 Unix 时间戳（秒）
+
+from collections import Counter
+from datetime import datetime, timezone
+
+FIELDS = ("temperature", "humidity", "precipitationProbability", "weatherCode")
+
+# 汇总粒度（秒）；按北京时间对齐，例如 daily 为每天 0 点到 24 点
+INTERVALS = {"1h": 3600, "3h": 3 * 3600, "daily": 24 * 3600}
+LOCAL_OFFSET = 8 * 3600
+
+
+def to_columns(times, items):
+    """逐小时数据（字典列表）转换为列式：{"time": [...], "temperature": [...], ...}"""
+    columns = {"time": list(times)}
+    for field in FIELDS:
+        columns[field] = [item.get(field) for item in items]
+    return columns
+
+
+def to_rows(columns):
+    """列式数据转换回逐条字典，时间转换为 ISO 字符串（与逐小时接口的格式一致）"""
+    names = [name for name in columns if name != "time"]
+    rows = []
+    for i, timestamp in enumerate(columns["time"]):
+        row = {"time": datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        for name in names:
+            row[name] = columns[name][i]
+        rows.append(row)
+    return rows
+
+
+def aggregate(columns, interval):
+    """
+    按时间段汇总列式数据：温度最低/最高/平均、湿度平均、降雨概率最大、出现最多的天气代码
+    时间轴已排序，同一时间段的数据是连续的，因此先切出各段的下标范围，再逐列对切片求值
+    """
+    size = INTERVALS[interval]
+    times = columns["time"]
+    if size == 3600:
+        return columns
+
+    # 各时间段的 [起点, 终点) 下标
+    bounds = []
+    for i, timestamp in enumerate(times):
+        bucket = (timestamp + LOCAL_OFFSET) // size
+        if not bounds or bounds[-1][0] != bucket:
+            bounds.append([bucket, i, i + 1])
+        else:
+            bounds[-1][2] = i + 1
+
+    result = {
+        "time": [bucket * size - LOCAL_OFFSET for bucket, _, _ in bounds],
+        "temperatureMin": [], "temperatureMax": [], "temperatureMean": [],
+        "humidityMean": [], "precipitationProbabilityMax": [], "weatherCode": [],
+    }
+    for _, lo, hi in bounds:
+        temperature = present(columns["temperature"][lo:hi])
+        humidity = present(columns["humidity"][lo:hi])
+        rain = present(columns["precipitationProbability"][lo:hi])
+        codes = present(columns["weatherCode"][lo:hi])
+        result["temperatureMin"].append(min(temperature) if temperature else None)
+        result["temperatureMax"].append(max(temperature) if temperature else None)
+        result["temperatureMean"].append(mean(temperature))
+        result["humidityMean"].append(mean(humidity))
+        result["precipitationProbabilityMax"].append(max(rain) if rain else None)
+        # 次数相同时取最早出现的天气代码
+        result["weatherCode"].append(Counter(codes).most_common(1)[0][0] if codes else None)
+    return result
+
+
+def present(values):
+    return [value for value in values if value is not None]
+
+
+def mean(values):
+    return round(sum(values) / len(values), 1) if values else None
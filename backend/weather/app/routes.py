@@ -1,14 +1,17 @@
 # app/routes.py
 
 from flask import Blueprint, request, jsonify
-from .weather_api import get_weather_forecast  # ✨ 确认这个导入是正确的
+from .weather_api import get_weather_batch, get_weather_forecast  # ✨ 确认这个导入是正确的
+from .aggregate import INTERVALS
+from common import config, http_client
+from common.cache import SingleFlight, TTLCache
+from common.db import data_path
+from common.sse import sse_event, sse_response, wants_stream
 import requests
 import json
+import logging
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-import os
-
-load_dotenv(dotenv_path='../.env')
 
 def to_utc_iso(date_str, hour=0):
     # ... 此函数无需修改 ...
@@ -17,6 +20,41 @@ def to_utc_iso(date_str, hour=0):
     return utc_time.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 routes = Blueprint('routes', __name__)
+logger = logging.getLogger(__name__)
+
+# 批量查询一次最多包含的条目数
+WEATHER_BATCH_MAX = config.get_int("WEATHER_BATCH_MAX", 20)
+
+
+# 出行建议缓存：天气相近（温度、降雨概率、时段落在同一区间）的请求共用同一条建议
+advice_cache = TTLCache(
+    "weather_advice",
+    ttl=config.get_int("ADVICE_CACHE_TTL", 6 * 3600),
+    maxsize=config.get_int("ADVICE_CACHE_SIZE", 2000),
+    db_path=data_path("cache.sqlite3")
+)
+advice_flight = SingleFlight()
+# 建议只参考前几个小时的天气
+ADVICE_HOURS = 6
+# 温度区间宽度（℃）、降雨概率区间的分界点（%）、时段的分界点（北京时间小时）
+ADVICE_TEMPERATURE_BAND = 5
+ADVICE_RAIN_BANDS = (20, 50, 80)
+ADVICE_TIME_SLOTS = (6, 12, 18)
+ADVICE_SLOT_NAMES = ("凌晨", "上午", "下午", "晚上")
+# 提示词的格式变化时修改版本号，按旧提示词生成的缓存建议不再命中
+ADVICE_PROMPT_VERSION = 2
+
+
+def weather_options(data):
+    """
+    返回格式选项 (format, interval)：format 为 rows（默认）或 columnar，
+    interval 为 1h（默认）、3h 或 daily；参数不正确时抛出 ValueError
+    """
+    fmt = data.get("format", "rows")
+    interval = data.get("interval", "1h")
+    if fmt not in ("rows", "columnar") or interval not in INTERVALS:
+        raise ValueError((fmt, interval))
+    return fmt, interval
 
 
 @routes.route('/api/weather', methods=['POST'])
@@ -28,9 +66,13 @@ def weather():
 
     if not location or not start or not end:
         return jsonify({"error": "缺少参数"}), 400
+    try:
+        fmt, interval = weather_options(data)
+    except ValueError:
+        return jsonify({"error": "format 或 interval 参数不正确"}), 400
 
     #  解包从 get_weather_forecast 返回的元组
-    result_data, error_type = get_weather_forecast(location, start, end)
+    result_data, error_type = get_weather_forecast(location, start, end, fmt, interval)
 
     #  根据 error_type 判断如何响应
     if error_type == "INVALID_LOCATION":
@@ -42,10 +84,51 @@ def weather():
         return jsonify({"error": "天气服务暂时不可用，请稍后再试"}), 503 # 503 Service Unavailable 更合适
 
     # 如果没有错误 (error_type is None)，正常返回天气数据
-    print("返回的天气数据：", result_data)
+    logger.debug("返回天气数据", extra={'location': location, 'format': fmt, 'interval': interval})
     return jsonify(result_data)
 
 
+@routes.route('/api/weather/batch', methods=['POST'])
+def weather_batch():
+    """
+    批量查询多个地点、多个时间段的天气：entries 为 [{location, start_date, end_date}, ...]
+    结果按 entries 的顺序返回，每个条目单独返回 weather 或 error（INVALID_LOCATION / API_ERROR）
+    format / interval 与 /api/weather 相同，对所有条目生效
+    """
+    data = request.get_json()
+    entries = data.get("entries")
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "缺少参数"}), 400
+    if len(entries) > WEATHER_BATCH_MAX:
+        return jsonify({"error": f"一次最多查询{WEATHER_BATCH_MAX}个条目"}), 400
+    try:
+        fmt, interval = weather_options(data)
+    except ValueError:
+        return jsonify({"error": "format 或 interval 参数不正确"}), 400
+
+    windows = []
+    for index, entry in enumerate(entries):
+        try:
+            location = str(entry["location"]).strip()
+            start = to_utc_iso(entry["start_date"], hour=0)
+            end = to_utc_iso(entry["end_date"], hour=23)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "缺少参数", "index": index}), 400
+        if not location:
+            return jsonify({"error": "缺少参数", "index": index}), 400
+        windows.append((location, start, end))
+
+    results = []
+    for entry, (result_data, error_type) in zip(entries, get_weather_batch(windows, fmt, interval)):
+        result = {"location": entry["location"], "start_date": entry["start_date"], "end_date": entry["end_date"]}
+        if error_type is not None:
+            result["error"] = error_type
+        else:
+            result.update(result_data)
+        results.append(result)
+    return jsonify({"results": results})
+
+
 # ... /api/advice 路由无需修改 ...
 @routes.route('/api/advice', methods=['POST'])
 def get_advice():
@@ -56,20 +139,22 @@ def get_advice():
     if not weather_data:
         return jsonify({"error": "缺少天气数据"}), 400
     
-    moonshot_api_key = os.getenv("MOONSHOT_API_KEY")
+    moonshot_api_key = config.get("MOONSHOT_API_KEY")
     if not moonshot_api_key:
         return jsonify({"error": "后端配置错误，缺少 Kimi API Key"}), 500
-    
-    prompt = "我将在以下时间段出行，总结一些天气状况，并请根据天气数据给出穿衣建议和行李建议：\n\n"
-    for item in weather_data[:6]:
-        time = item.get("time", "未知时间")
-        temp = item.get("temperature", "未知")
-        rain = item.get("precipitationProbability", "未知")
-        prompt += f"时间：{time}，温度：{temp}℃，降雨概率：{rain}%\n"
 
-    prompt += "\n请告诉我该穿什么、是否需要带伞或其他物品，简洁清晰，分点给出回答，每一点换一行"
+    stream = wants_stream(data)
+    buckets = advice_buckets(weather_data[:ADVICE_HOURS])
+    cache_key = advice_signature(buckets)
+    advice = advice_cache.get(cache_key)
+    if advice is not None:
+        if stream:
+            return sse_response(iter([sse_event({"advice": advice, "cached": True}, event="done")]))
+        return jsonify({"advice": advice, "cached": True})
+    
+    prompt = build_advice_prompt(buckets)
 
-    url = "https://api.moonshot.cn/v1/chat/completions"
+    url = "/v1/chat/completions"
     headers = {
         "Authorization": f"{moonshot_api_key}",
         "Content-Type": "application/json"
@@ -80,12 +165,129 @@ def get_advice():
             {"role": "user", "content": prompt}
         ]
     }
+    if stream:
+        payload["stream"] = True
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        return jsonify({"advice": result["choices"][0]["message"]["content"]})
+        if stream:
+            # 流式模式下先确认上游已开始返回，再切换为 SSE，这样错误仍按原来的 JSON 格式返回
+            response = http_client.post('moonshot', url, headers=headers, json=payload, stream=True)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                # 流式响应不会自动读完，出错时需要关闭，连接才能回到连接池
+                response.close()
+                raise
+            return sse_response(relay_advice_stream(response, cache_key))
+        # 相同区间的并发请求只调用一次大模型
+        advice = advice_flight.do(cache_key, fetch_advice, url, headers, payload, cache_key)
+        return jsonify({"advice": advice, "cached": False})
     except requests.exceptions.RequestException as e:
-        print("Moonshot API 调用失败：", e)
+        logger.warning("Moonshot API 调用失败", extra={'error': str(e)})
         return jsonify({"error": "获取出行建议失败，请稍后再试。"}), 500
+
+
+def advice_buckets(weather_data):
+    """
+    每小时的天气量化为 (时段, 温度区间, 降雨概率区间)，相邻且相同的小时合并；
+    缓存键和提示词都只使用量化后的区间，缓存的建议对同一个键下的所有预报都成立
+    """
+    buckets = []
+    for item in weather_data:
+        bucket = (time_slot(item.get("time")),
+                  band(item.get("temperature"), lambda t: int(t // ADVICE_TEMPERATURE_BAND)),
+                  band(item.get("precipitationProbability"), lambda p: bisect_right(ADVICE_RAIN_BANDS, p)))
+        if not buckets or buckets[-1] != bucket:
+            buckets.append(bucket)
+    return buckets
+
+
+def advice_signature(buckets):
+    """出行建议缓存键"""
+    return f"{ADVICE_PROMPT_VERSION}:" + "|".join(",".join(str(part) for part in bucket) for bucket in buckets)
+
+
+def build_advice_prompt(buckets):
+    """按量化后的区间描述天气，不包含具体的时间和数值"""
+    prompt = "我将在以下时段出行，温度和降雨概率均为区间，请根据这些天气情况给出穿衣建议和行李建议：\n\n"
+    for slot, temperature, rain in buckets:
+        prompt += f"时段：{describe_slot(slot)}，温度：{describe_temperature(temperature)}，降雨概率：{describe_rain(rain)}\n"
+    prompt += "\n请告诉我该穿什么、是否需要带伞或其他物品，简洁清晰，分点给出回答，每一点换一行"
+    return prompt
+
+
+def describe_slot(slot):
+    return "未知时段" if slot == "x" else ADVICE_SLOT_NAMES[slot]
+
+
+def describe_temperature(temperature):
+    if temperature == "x":
+        return "未知"
+    low = temperature * ADVICE_TEMPERATURE_BAND
+    return f"{low}~{low + ADVICE_TEMPERATURE_BAND}℃"
+
+
+def describe_rain(rain):
+    if rain == "x":
+        return "未知"
+    if rain == 0:
+        return f"低于{ADVICE_RAIN_BANDS[0]}%"
+    if rain == len(ADVICE_RAIN_BANDS):
+        return f"{ADVICE_RAIN_BANDS[-1]}%以上"
+    return f"{ADVICE_RAIN_BANDS[rain - 1]}%~{ADVICE_RAIN_BANDS[rain]}%"
+
+
+def band(value, func):
+    try:
+        return func(float(value))
+    except (TypeError, ValueError):
+        return "x"
+
+
+def time_slot(value):
+    """UTC 时间所在的北京时间时段：0 凌晨、1 上午、2 下午、3 晚上"""
+    try:
+        utc_time = datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return "x"
+    return bisect_right(ADVICE_TIME_SLOTS, (utc_time + timedelta(hours=8)).hour)
+
+
+def fetch_advice(url, headers, payload, cache_key):
+    response = http_client.post('moonshot', url, headers=headers, json=payload)
+    response.raise_for_status()
+    advice = response.json()["choices"][0]["message"]["content"]
+    advice_cache.set(cache_key, advice)
+    return advice
+
+
+def relay_advice_stream(response, cache_key=None):
+    """
+    把 Moonshot 的流式输出转发为 SSE：生成过程中发送 {"delta": ...}，
+    结束时发送 done 事件 {"advice": 完整建议, "cached": false} 并写入缓存，中途出错发送 error 事件
+    """
+    parts = []
+    # text/event-stream 未声明字符集时 requests 默认按 ISO-8859-1 解码
+    response.encoding = "utf-8"
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            chunk = line[len("data:"):].strip()
+            if chunk == "[DONE]":
+                break
+            choices = json.loads(chunk).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+        advice = "".join(parts)
+        if cache_key is not None and advice:
+            advice_cache.set(cache_key, advice)
+        yield sse_event({"advice": advice, "cached": False}, event="done")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning("Moonshot API 流式输出中断", extra={'error': str(e)})
+        yield sse_event({"error": "获取出行建议失败，请稍后再试。"}, event="error")
+    finally:
+        # 客户端断开时生成器被关闭，同时关闭上游连接
+        response.close()
@@ -1,30 +1,59 @@
 # weather_api.py
 
+import logging
 import requests
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import os
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv(dotenv_path='../.env')
+from common import config, http_client, metrics
+from common.cache import SingleFlight, TTLCache, normalize_key
 
+from . import aggregate
 
-API_KEY = os.getenv("TOMORROW_API_KEY")
 
-def filter_by_time(data, start, end):
-    # ... 此函数无需修改 ...
-    start_dt = datetime.strptime(start, "%Y-%m-%dT%H:%M:%SZ")
-    end_dt = datetime.strptime(end, "%Y-%m-%dT%H:%M:%SZ")
-    return [item for item in data if start_dt <= datetime.strptime(item["time"], "%Y-%m-%dT%H:%M:%SZ") <= end_dt]
+API_KEY = config.get("TOMORROW_API_KEY")
+logger = logging.getLogger(__name__)
 
-# ✨ --- 修改 get_weather_forecast 函数 --- ✨
-def get_weather_forecast(location, start_time, end_time):
-    url = "https://api.tomorrow.io/v4/weather/forecast"
+# 每个地点的完整逐小时预报缓存：tomorrow.io 大约每小时更新一次预报
+WEATHER_CACHE_TTL = config.get_int("WEATHER_CACHE_TTL", 3600)
+# 无效地点也短暂缓存，避免重复消耗配额
+WEATHER_INVALID_TTL = config.get_int("WEATHER_INVALID_TTL", 600)
+timeline_cache = TTLCache(
+    "weather_timeline",
+    ttl=WEATHER_CACHE_TTL,
+    maxsize=config.get_int("WEATHER_CACHE_SIZE", 500)
+)
+# 同一地点的并发请求只向上游查询一次
+timeline_flight = SingleFlight()
+# 批量查询时同时请求的地点数
+WEATHER_BATCH_WORKERS = config.get_int("WEATHER_BATCH_WORKERS", 8)
+weather_executor = ThreadPoolExecutor(max_workers=WEATHER_BATCH_WORKERS, thread_name_prefix="weather")
+
+def parse_time(value):
+    """把 "2025-06-01T00:00:00Z" 格式的时间转换为 Unix 时间戳（秒）"""
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+def normalize_location(location):
+    """归一化地点：全角转半角、去除多余空白、统一小写；经纬度保留两位小数"""
+    text = normalize_key(location)
+    parts = text.split(",")
+    if len(parts) == 2:
+        try:
+            return ",".join(f"{float(part):.2f}" for part in parts)
+        except ValueError:
+            pass
+    return text
+
+def fetch_weather_timeline(location):
+    """
+    从 tomorrow.io 获取地点的完整逐小时预报
+    返回 (timeline, error_type)，timeline 为 {"times": [时间戳...], "items": [逐小时数据...]}
+    """
+    url = "/v4/weather/forecast"
     params = {
         "location": location,
         "timesteps": "1h",
-        "startTime": start_time,
-        "endTime": end_time,
         "apikey": API_KEY,
         "fields": [
             "temperature",
@@ -34,17 +63,24 @@ def get_weather_forecast(location, start_time, end_time):
         ]
     }
 
-    response = requests.get(url, params=params)
-    
+    try:
+        response = http_client.get('tomorrow', url, params=params)
+    except requests.exceptions.RequestException as e:
+        # 超时、连接失败等网络错误
+        logger.warning("天气API请求异常", extra={'location': location, 'error': str(e)})
+        return None, "API_ERROR"
+
     # ✨ 关键：检查响应状态码
     if response.status_code == 400:
         # Tomorrow.io 通常用 400 状态码表示请求有问题，很可能是地点无效
-        print(f"地点 '{location}' 可能无效，API返回400。响应: {response.text}")
+        logger.info("地点可能无效，天气API返回400", extra={'location': location, 'response': response.text[:500]})
         return None, "INVALID_LOCATION"
-    
+
     if response.status_code != 200:
         # 处理其他非成功的状态码
-        print(f"天气API请求失败，状态码: {response.status_code}。响应: {response.text}")
+        logger.warning("天气API请求失败", extra={'location': location, 'status': response.status_code,
+                                              'response': response.text[:500]})
+        metrics.upstream_errors.inc('tomorrow', str(response.status_code))
         return None, "API_ERROR"
 
     data = response.json()
@@ -52,22 +88,110 @@ def get_weather_forecast(location, start_time, end_time):
 
     # ✨ 再次检查：即使成功返回200，也可能因为地点问题而没有数据
     if not hourly_data:
-        print(f"地点 '{location}' 返回了空的天气数据，可能无效。")
+        logger.info("地点返回了空的天气数据，可能无效", extra={'location': location})
         return None, "INVALID_LOCATION"
 
-    # ... 数据提取部分保持不变 ...
-    simplified_data = []
+    # 提取需要的字段，并预先解析时间，之后按时间窗口二分查找
+    items = []
     for item in hourly_data:
         values = item.get("values", {})
-        simplified_data.append({
+        items.append({
             "time": item.get("time"),
             "temperature": values.get("temperature"),
             "humidity": values.get("humidity"),
             "precipitationProbability": values.get("precipitationProbability"),
             "weatherCode": values.get("weatherCode")
         })
-    
-    filtered_data = filter_by_time(simplified_data, start_time, end_time)
-    
+    items.sort(key=lambda item: item["time"])
+    return {"times": [parse_time(item["time"]) for item in items], "items": items}, None
+
+def get_weather_timeline(location):
+    """读取地点的逐小时预报，优先使用缓存；返回 (timeline, error_type)"""
+    key = normalize_location(location)
+    cached = timeline_cache.get(key)
+    if cached is not None:
+        return cached.get("timeline"), cached.get("error")
+    return timeline_flight.do(key, fetch_and_cache_timeline, key, location)
+
+def fetch_and_cache_timeline(key, location):
+    timeline, error_type = fetch_weather_timeline(location)
+    if error_type is None:
+        timeline_cache.set(key, {"timeline": timeline})
+    elif error_type == "INVALID_LOCATION":
+        timeline_cache.set(key, {"error": error_type}, ttl=WEATHER_INVALID_TTL)
+    return timeline, error_type
+
+def prefetch_timeline(location):
+    """
+    后台任务：预取地点的完整逐小时预报（覆盖任意出行时间段）
+    不经过 timeline_flight，避免用户请求等待按后台优先级排队的上游调用；上游出错时抛出异常
+    """
+    key = normalize_location(location)
+    cached = timeline_cache.get(key)
+    if cached is not None:
+        return "已缓存"
+    timeline, error_type = fetch_and_cache_timeline(key, location)
+    if error_type == "API_ERROR":
+        raise RuntimeError("天气API请求失败")
+    return error_type or f"{len(timeline['times'])} 小时"
+
+def slice_bounds(timeline, start, end):
+    """[start, end] 时间窗口（UTC ISO 字符串）在逐小时数据中的下标范围"""
+    times = timeline["times"]
+    return bisect_left(times, parse_time(start)), bisect_right(times, parse_time(end))
+
+def slice_timeline(timeline, start, end):
+    """返回 [start, end] 时间窗口内的逐小时数据（start/end 为 UTC ISO 字符串）"""
+    lo, hi = slice_bounds(timeline, start, end)
+    return timeline["items"][lo:hi]
+
+def format_weather(timeline, start_time, end_time, fmt="rows", interval="1h"):
+    """
+    按请求的格式返回时间窗口内的天气：
+    fmt 为 rows（默认，逐条字典）或 columnar（每个字段一个数组，时间为 Unix 时间戳）；
+    interval 为 1h（默认）、3h 或 daily，后两者返回汇总数据
+    """
+    if fmt == "rows" and interval == "1h":
+        return {"weather": slice_timeline(timeline, start_time, end_time)}
+    lo, hi = slice_bounds(timeline, start_time, end_time)
+    columns = aggregate.to_columns(timeline["times"][lo:hi], timeline["items"][lo:hi])
+    columns = aggregate.aggregate(columns, interval)
+    if fmt == "columnar":
+        return {"format": "columnar", "interval": interval, "weather": columns}
+    return {"interval": interval, "weather": aggregate.to_rows(columns)}
+
+def get_weather_forecast(location, start_time, end_time, fmt="rows", interval="1h"):
+    timeline, error_type = get_weather_timeline(location)
+    if error_type is not None:
+        return None, error_type
+
     # ✨ 返回一个包含数据的字典和 None 表示成功
-    return {"weather": filtered_data}, None
+    return format_weather(timeline, start_time, end_time, fmt, interval), None
+
+def get_weather_batch(entries, fmt="rows", interval="1h"):
+    """
+    批量查询：entries 为 (location, start_time, end_time) 列表
+    相同地点（归一化后）只读取一次逐小时预报，不同地点并发读取；
+    按 entries 的顺序返回 (result_data, error_type) 列表
+    """
+    locations = {}
+    for location, _, _ in entries:
+        locations.setdefault(normalize_location(location), location)
+    futures = {key: weather_executor.submit(get_weather_timeline, location) for key, location in locations.items()}
+
+    timelines = {}
+    for key, future in futures.items():
+        try:
+            timelines[key] = future.result()
+        except Exception as e:
+            logger.warning("批量天气查询错误", extra={'location': locations[key], 'error': str(e)})
+            timelines[key] = (None, "API_ERROR")
+
+    results = []
+    for location, start_time, end_time in entries:
+        timeline, error_type = timelines[normalize_location(location)]
+        if error_type is not None:
+            results.append((None, error_type))
+        else:
+            results.append((format_weather(timeline, start_time, end_time, fmt, interval), None))
+    return results
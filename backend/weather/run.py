@@ -1,3 +1,9 @@
+import os
+import sys
+
+# 天气模块依赖 backend/common，单独运行时需要把 backend 目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from app import create_app
 
 app = create_app()
@@ -44,6 +44,40 @@ class RouteUtils {
     return coordinates.filter(coord => this.isValidCoord(coord));
   }
   
+  /**
+   * 解码后端返回的紧凑路径（pathFormat: 'polyline'）
+   * @param {string} encoded - 编码后的路径字符串
+   * @param {number} precision - 坐标精度（小数位数），与后端一致默认为6
+   * @returns {Array} - 坐标数组 [[lng, lat], ...]
+   */
+  static decodePolyline(encoded, precision = 6) {
+    const factor = Math.pow(10, precision);
+    const coordinates = [];
+    let index = 0;
+    let lng = 0;
+    let lat = 0;
+
+    while (index < encoded.length) {
+      const deltas = [];
+      for (let k = 0; k < 2; k++) {
+        let result = 0;
+        let shift = 0;
+        let byte;
+        do {
+          byte = encoded.charCodeAt(index++) - 63;
+          result += (byte & 0x1f) * Math.pow(2, shift);
+          shift += 5;
+        } while (byte >= 0x20);
+        deltas.push(result % 2 ? -(result + 1) / 2 : result / 2);
+      }
+      lng += deltas[0];
+      lat += deltas[1];
+      coordinates.push([lng / factor, lat / factor]);
+    }
+
+    return coordinates;
+  }
+
   /**
    * 获取交通方式的图标
    * @param {string} type - 交通方式类型